@@ -0,0 +1,59 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+from benchmarks.mock_yts import MockYTS
+
+
+# Movies a `--since-last-run` crawl into directory wrote files for
+def _crawl(mock, directory, extra):
+    from yifi.main import build_parser
+    from yifi.scraper import Scraper
+
+    argv = ['-o', directory, '--api-url', mock.api_url, '-q', 'all', '--since-last-run',
+            '--export-path', os.path.join(directory, 'YiFi-Scraper.csv')] + extra
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        scraper = Scraper(build_parser().parse_args(argv))
+        scraper.download()
+    return len(scraper.downloaded_movie_ids or ())
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Checks that --since-last-run picks up new uploads of a mock YTS "
+                                                   "whose movies carry only the fields the real API returns.",
+                                     epilog = "Arguments after -- are passed to yifi, e.g. -- --engine async")
+    parser.add_argument('--movies', type = int, default = 120, help = 'Catalog size of the first crawl.')
+    parser.add_argument('--added', type = int, default = 30, help = 'Movies uploaded before the second crawl.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Catalog seed.')
+    argv = sys.argv[1:]
+    extra = []
+    if '--' in argv:
+        extra = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix = "yifi-incremental-")
+    failed = []
+    try:
+        with MockYTS(movies = args.movies, seed = args.seed) as mock:
+            # ( crawl, movies expected ) : everything, then the new uploads only, then nothing
+            for name, expected in [('first', args.movies), ('new uploads', args.added), ('unchanged', 0)]:
+                if name == 'new uploads':
+                    mock.catalog.add(args.added)
+                movies = _crawl(mock, directory, extra)
+                print(f"{name:<12} {movies:>6} movies, expected {expected}")
+                if movies != expected:
+                    failed.append(f"The {name} crawl downloaded {movies} movies instead of {expected}")
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+
+    for message in failed:
+        print(message, file = sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
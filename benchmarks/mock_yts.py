@@ -0,0 +1,297 @@
+import io
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary',
+          'Drama', 'Family', 'Fantasy', 'Film-Noir', 'History', 'Horror', 'Music', 'Musical',
+          'Mystery', 'Romance', 'Sci-Fi', 'Sport', 'Thriller', 'War', 'Western']
+QUALITIES = ['720p', '1080p', '2160p', '3D']
+SORT_KEYS = ['title', 'year', 'rating', 'peers', 'seeds', 'download_count', 'like_count', 'date_added']
+# Pixel sizes of the API's small, medium and large covers
+COVER_SIZES = {'small': (45, 67), 'medium': (230, 345), 'large': (500, 750)}
+
+
+# Real JPEG of the cover size when Pillow is installed, otherwise an undecodable
+# body scaled from poster_size ( the large cover ) by area
+def _poster_body(size, poster_size, seed):
+    width, height = COVER_SIZES[size]
+    try:
+        from PIL import Image
+    except ImportError:
+        length = poster_size * width * height // (500 * 750)
+        return b"\xff\xd8\xff\xe0" + b"0" * max(0, length - 4)
+    # Coarse noise scaled up : compresses about like a photo
+    rand = random.Random(seed)
+    coarse = (max(1, width // 8), max(1, height // 8))
+    image = Image.frombytes('RGB', coarse, rand.randbytes(coarse[0] * coarse[1] * 3)).resize((width, height), Image.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, format = 'JPEG', quality = 90)
+    return output.getvalue()
+
+
+class Catalog:
+    """
+    Catalog class - Deterministic synthetic YTS catalog
+
+    Movies look like the objects of list_movies.json, the newest movie
+    has the highest id. The same seed always yields the same catalog.
+    """
+
+    def __init__(self, size, seed = 0):
+        self.size = size
+        self.seed = seed
+        self.base_url = None
+        self.__sorted = {}
+        self.__lock = threading.Lock()
+
+        self.__rand = random.Random(seed)
+        self.records = []
+        self.add(size)
+
+    # Uploads count new movies, the same seed and counts always yield the same catalog
+    def add(self, count):
+        rand = self.__rand
+        start = 1262304000
+        first = len(self.records) + 1
+        for movie_id in range(first, first + count):
+            year = rand.randint(1950, 2024)
+            qualities = [quality for quality in QUALITIES if rand.random() < 0.6] or ['1080p']
+            torrents = []
+            for quality in qualities:
+                torrent_hash = hashlib.sha1(f"{movie_id}-{quality}".encode()).hexdigest().upper()
+                size_bytes = rand.randint(500, 8000) * 1024 * 1024
+                torrents.append({'hash': torrent_hash,
+                                 'quality': quality,
+                                 'type': rand.choice(['web', 'bluray']),
+                                 'is_repack': '0',
+                                 'video_codec': 'x264',
+                                 'bit_depth': '8',
+                                 'audio_channels': '2.0',
+                                 'seeds': rand.randint(0, 2000),
+                                 'peers': rand.randint(0, 500),
+                                 'size': f"{size_bytes / (1 << 30):.2f} GB",
+                                 'size_bytes': size_bytes,
+                                 'date_uploaded': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + movie_id * 3600)),
+                                 'date_uploaded_unix': start + movie_id * 3600})
+            self.records.append({'id': movie_id,
+                                 'imdb_code': f"tt{movie_id + 1000000}",
+                                 'title': f"Movie {movie_id}",
+                                 'title_english': f"Movie {movie_id}",
+                                 'title_long': f"Movie {movie_id} ({year})",
+                                 'slug': f"movie-{movie_id}-{year}",
+                                 'year': year,
+                                 'rating': round(rand.uniform(1, 9.9), 1),
+                                 'runtime': rand.randint(70, 180),
+                                 'genres': rand.sample(GENRES, rand.randint(1, 4)),
+                                 'language': rand.choice(['en', 'en', 'en', 'fr', 'es', 'ja']),
+                                 'mpa_rating': rand.choice(['', 'PG', 'PG-13', 'R']),
+                                 'download_count': rand.randint(0, 100000),
+                                 'like_count': rand.randint(0, 5000),
+                                 'state': 'ok',
+                                 'date_uploaded': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + movie_id * 3600)),
+                                 'date_uploaded_unix': start + movie_id * 3600,
+                                 'torrents': torrents})
+        with self.__lock:
+            self.size = len(self.records)
+            self.__sorted = {}
+
+    # Movie object as the API returns it, URLs point back to the mock
+    def movie(self, record):
+        base = self.base_url
+        movie = dict(record)
+        movie['url'] = f"{base}/movies/{record['slug']}"
+        for size in ('small', 'medium', 'large'):
+            movie[f'{size}_cover_image'] = f"{base}/assets/images/movies/{record['slug']}/{size}-cover.jpg"
+        movie['torrents'] = [dict(torrent, url = f"{base}/torrent/download/{torrent['hash']}")
+                             for torrent in record['torrents']]
+        return movie
+
+    def __ordered(self, sort_by, order_by):
+        key = (sort_by, order_by)
+        with self.__lock:
+            if key not in self.__sorted:
+                if sort_by in ('peers', 'seeds'):
+                    sort_key = lambda record: max(torrent[sort_by] for torrent in record['torrents'])
+                elif sort_by == 'date_added':
+                    sort_key = lambda record: record['date_uploaded_unix']
+                else:
+                    sort_key = lambda record: record[sort_by]
+                self.__sorted[key] = sorted(self.records, key = sort_key, reverse = order_by == 'desc')
+            return self.__sorted[key]
+
+    # list_movies.json with the filters the real API supports
+    def list_movies(self, query):
+        quality = query.get('quality', 'all')
+        genre = query.get('genre', 'all').lower()
+        minimum_rating = float(query.get('minimum_rating') or 0)
+        sort_by = query.get('sort_by', 'date_added')
+        sort_by = sort_by if sort_by in SORT_KEYS else 'date_added'
+        order_by = query.get('order_by', 'desc')
+        limit = max(1, min(50, int(query.get('limit') or 20)))
+        page = max(1, int(query.get('page') or 1))
+
+        matches = [record for record in self.__ordered(sort_by, order_by)
+                   if record['rating'] >= minimum_rating
+                   and (genre == 'all' or genre in [name.lower() for name in record['genres']])
+                   and (quality == 'all' or any(torrent['quality'].lower() == quality.lower()
+                                                for torrent in record['torrents']))]
+        data = {'movie_count': len(matches), 'limit': limit, 'page_number': page}
+        movies = [self.movie(record) for record in matches[(page - 1) * limit: page * limit]]
+        # The real API drops the key on pages past the end
+        if movies:
+            data['movies'] = movies
+        return {'status': 'ok', 'status_message': 'Query was successful', 'data': data}
+
+
+class MockYTS:
+    """
+    MockYTS class - Local stand-in for the YTS API, torrent and image hosts
+
+    Serves a synthetic `Catalog` with injected latency, 5xx errors and
+    429 throttling. Every request is counted and timed so benchmarks can
+    report what a run cost without touching the live site.
+    """
+
+    def __init__(self, movies = 1000, seed = 0, latency = 0.0, jitter = 0.0,
+                 error_rate = 0.0, throttle_rate = 0.0, retry_after = 1,
+                 torrent_size = 40 * 1024, poster_size = 120 * 1024, port = 0):
+        self.catalog = Catalog(movies, seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.torrent_body = b"d8:announce" + b"0" * max(0, torrent_size - 11)
+        self.poster_bodies = {size: _poster_body(size, poster_size, seed) for size in COVER_SIZES}
+
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in two writes, Nagle would hold the body for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                mock.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.catalog.base_url = self.base_url
+        self.api_url = self.base_url + "/api/v2/"
+        self.thread = None
+
+    # Counters of the current measurement window
+    def reset(self):
+        with self.lock:
+            self.requests = {'api': 0, 'torrent': 0, 'image': 0, 'other': 0}
+            self.statuses = {}
+            self.latencies = []
+
+    def __roll(self, rate):
+        if not rate:
+            return False
+        with self.lock:
+            return self.rand.random() < rate
+
+    def handle(self, request):
+        started = time.perf_counter()
+        path = urlsplit(request.path).path
+        if path.endswith('list_movies.json'):
+            kind = 'api'
+        elif path.startswith('/torrent/'):
+            kind = 'torrent'
+        elif path.startswith('/assets/'):
+            kind = 'image'
+        else:
+            kind = 'other'
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rand.uniform(-self.jitter, self.jitter)))
+
+        headers = {}
+        if self.__roll(self.throttle_rate):
+            status, body = 429, b'Too Many Requests'
+            headers['Retry-After'] = str(self.retry_after)
+        elif self.__roll(self.error_rate):
+            status, body = 500, b'Internal Server Error'
+        elif kind == 'api':
+            query = {key: values[0] for key, values in parse_qs(urlsplit(request.path).query).items()}
+            status, body = 200, json.dumps(self.catalog.list_movies(query)).encode()
+            headers['Content-Type'] = 'application/json'
+            headers['ETag'] = '"' + hashlib.md5(body).hexdigest() + '"'
+            if request.headers.get('If-None-Match') == headers['ETag']:
+                status, body = 304, b''
+        elif kind == 'torrent':
+            status, body = 200, self.torrent_body
+            headers['Content-Type'] = 'application/x-bittorrent'
+        elif kind == 'image':
+            size = path.rsplit('/', 1)[-1].split('-')[0]
+            status, body = 200, self.poster_bodies.get(size, self.poster_bodies['large'])
+            headers['Content-Type'] = 'image/jpeg'
+        else:
+            status, body = 404, b'Not Found'
+
+        request.send_response(status)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+        with self.lock:
+            self.requests[kind] += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies.append(time.perf_counter() - started)
+
+    def start(self):
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Local mock of the YTS API for benchmarks.")
+    parser.add_argument('--movies', type = int, default = 1000, help = 'Catalog size.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Catalog seed.')
+    parser.add_argument('--port', type = int, default = 8000, help = 'Port to listen on.')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'Added latency per request in seconds.')
+    parser.add_argument('--jitter', type = float, default = 0.0, help = 'Random +/- latency in seconds.')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = 'Fraction of requests answered with 500.')
+    parser.add_argument('--throttle-rate', type = float, default = 0.0, help = 'Fraction of requests answered with 429.')
+    args = parser.parse_args()
+
+    mock = MockYTS(movies = args.movies, seed = args.seed, latency = args.latency, jitter = args.jitter,
+                   error_rate = args.error_rate, throttle_rate = args.throttle_rate, port = args.port)
+    print(f"Mock YTS serving {args.movies} movies. Use : yifi --api-url {mock.api_url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import statistics
+import contextlib
+import multiprocessing
+from urllib.parse import urlsplit
+
+from benchmarks.mock_yts import MockYTS
+
+# Extra yifi arguments of every scenario, new engines only need an entry here
+SCENARIOS = {
+    'serial': [],
+    'multi': ['-m'],
+    'async': ['--engine', 'async'],
+}
+
+
+# Runs one download in a fresh interpreter so peak RSS belongs to the run alone
+def _child(argv, results):
+    from yifi.main import build_parser
+    from yifi.scraper import Scraper
+
+    args = build_parser().parse_args(argv)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        scraper = Scraper(args)
+        started = time.perf_counter()
+        scraper.download()
+        elapsed = time.perf_counter() - started
+    snapshot = scraper.stats.snapshot()
+    results.put({'elapsed': elapsed,
+                 'movies': len(scraper.downloaded_movie_ids or ()),
+                 'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                 'hosts': snapshot['hosts'],
+                 # Summed over every worker, so it can exceed the wall time
+                 'waits': sum(snapshot['phases'].get(phase, {}).get('total', 0.0)
+                              for phase in ('rate_limit_wait', 'retry_backoff'))})
+
+
+# Bytes on disk, hard links into the blob store are counted once
+def _bytes_written(directory):
+    seen = set()
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            stat = os.lstat(os.path.join(root, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n = 100, method = 'inclusive')[percent - 1]
+
+
+def run_scenario(mock, name, extra):
+    directory = tempfile.mkdtemp(prefix = f"yifi-bench-{name}-")
+    argv = ['-o', directory, '--api-url', mock.api_url, '-q', 'all',
+            '--export-path', os.path.join(directory, 'YiFi-Scraper.csv')] + SCENARIOS[name] + extra
+    mock.reset()
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    child = context.Process(target = _child, args = (argv, results))
+    child.start()
+    result = results.get()
+    child.join()
+    try:
+        # Client side latency of every attempt from the scraper's own stats, the mock serves one host
+        client = result['hosts'].get(urlsplit(mock.api_url).netloc, {})
+        with mock.lock:
+            latencies = list(mock.latencies)
+            requests = dict(mock.requests)
+            statuses = dict(mock.statuses)
+        return {'scenario': name,
+                'elapsed': round(result['elapsed'], 3),
+                'movies': result['movies'],
+                'movies_per_second': round(result['movies'] / result['elapsed'], 2) if result['elapsed'] else 0.0,
+                'requests': sum(requests.values()),
+                'requests_by_kind': requests,
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'bytes_written': _bytes_written(directory),
+                'p50_ms': round(client.get('p50', 0.0) * 1000, 2),
+                'p99_ms': round(client.get('p99', 0.0) * 1000, 2),
+                'wait_s': round(result['waits'], 3),
+                'server_p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+                'server_p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+                'peak_rss_mb': round(result['peak_rss'] / (1 << 20), 1)}
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "End to end benchmarks of Scraper.download() against a local mock YTS.",
+                                     epilog = "Arguments after -- are passed to yifi, e.g. -- --rate 500 --max-rate 1000")
+    parser.add_argument('--movies', type = int, default = 500, help = 'Synthetic catalog size.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Catalog seed.')
+    parser.add_argument('--latency', type = float, default = 0.02, help = 'Added latency per request in seconds.')
+    parser.add_argument('--jitter', type = float, default = 0.01, help = 'Random +/- latency in seconds.')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = 'Fraction of requests answered with 500.')
+    parser.add_argument('--throttle-rate', type = float, default = 0.0, help = 'Fraction of requests answered with 429.')
+    parser.add_argument('--scenario', action = 'append', choices = list(SCENARIOS),
+                        help = 'Scenario to run, repeatable. Default : all of them.')
+    parser.add_argument('--repeat', type = int, default = 1, help = 'Runs per scenario.')
+    parser.add_argument('--json', dest = 'json_path', help = 'Also write the results to this file.')
+    argv = sys.argv[1:]
+    extra = []
+    if '--' in argv:
+        extra = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    args = parser.parse_args(argv)
+
+    results = []
+    with MockYTS(movies = args.movies, seed = args.seed, latency = args.latency, jitter = args.jitter,
+                 error_rate = args.error_rate, throttle_rate = args.throttle_rate) as mock:
+        for name in args.scenario or list(SCENARIOS):
+            for run in range(args.repeat):
+                result = run_scenario(mock, name, extra)
+                results.append(result)
+                print(f"{name:<8} {result['elapsed']:>8.2f}s {result['movies_per_second']:>9.1f} movies/s "
+                      f"{result['requests']:>7} requests {result['bytes_written'] / (1 << 20):>9.1f} MB "
+                      f"p50 {result['p50_ms']:>7.1f} ms p99 {result['p99_ms']:>7.1f} ms "
+                      f"waits {result['wait_s']:>7.2f}s server p50 {result['server_p50_ms']:>7.1f} ms "
+                      f"rss {result['peak_rss_mb']:>7.1f} MB")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as file:
+            json.dump({'movies': args.movies, 'seed': args.seed, 'latency': args.latency,
+                       'jitter': args.jitter, 'error_rate': args.error_rate,
+                       'throttle_rate': args.throttle_rate, 'extra': extra, 'results': results}, file, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Snippets timed in a fresh interpreter, `python -c pass` is the baseline subtracted from each
+SCENARIOS = {
+    'help': "import sys; sys.argv[1:] = ['--help']\nfrom yifi.main import main\ntry:\n    main()\nexcept SystemExit:\n    pass",
+    'import': "import yifi, yifi.main",
+    'user-agent': "import sys\nfrom yifi.useragent import UserAgentPool\nUserAgentPool(sys.argv[1]).next()",
+}
+
+# Modules a run only needs once it sends requests, `yifi --help` must not load them
+HEAVY_MODULES = ['requests', 'urllib3', 'tqdm', 'fake_useragent', 'sqlite3', 'aiohttp', 'pyarrow']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _environment():
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, environment.get('PYTHONPATH')]))
+    return environment
+
+
+# Median wall time of a snippet in milliseconds, the first run warms the OS caches
+def _time(code, args, repeat):
+    timings = []
+    for run in range(repeat + 1):
+        started = time.perf_counter_ns()
+        subprocess.run([sys.executable, '-c', code] + args, env = _environment(), check = True,
+                       stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        if run:
+            timings.append((time.perf_counter_ns() - started) / 1e6)
+    return statistics.median(timings)
+
+
+# Heavy modules loaded by building the parser and parsing the default arguments
+def heavy_imports():
+    code = ("import sys\nfrom yifi.main import build_parser\nbuild_parser().parse_args([])\n"
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], env = _environment(), check = True,
+                            capture_output = True, text = True).stdout.strip()
+    return output.split(',') if output else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Startup cost of the yifi command, for cron and wrapper scripts.")
+    parser.add_argument('--repeat', type = int, default = 10, help = 'Runs per scenario.')
+    parser.add_argument('--budget', type = float, default = 100.0,
+                        help = 'Max milliseconds yifi --help may add to a bare interpreter. Exits with 1 above it.')
+    parser.add_argument('--json', dest = 'json_path', help = 'Also write the results to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix = "yifi-startup-") as directory:
+        # Built by the warm-up run, every timed run reads the cached pool
+        pool_path = os.path.join(directory, "user-agents.json")
+        bare = _time("pass", [], args.repeat)
+        results = {'bare_ms': round(bare, 2)}
+        print(f"{'bare':<12} {bare:>8.1f} ms")
+        for name, code in SCENARIOS.items():
+            elapsed = _time(code, [pool_path], args.repeat)
+            results[f"{name}_ms"] = round(elapsed - bare, 2)
+            print(f"{name:<12} {elapsed - bare:>8.1f} ms over bare")
+
+    results['heavy_imports'] = heavy_imports()
+    results['budget_ms'] = args.budget
+    failed = []
+    if results['help_ms'] > args.budget:
+        failed.append(f"yifi --help takes {results['help_ms']:.1f} ms, the budget is {args.budget:.1f} ms")
+    if results['heavy_imports']:
+        failed.append("yifi --help loads " + ", ".join(results['heavy_imports']))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as file:
+            json.dump(results, file, indent = 2)
+    for message in failed:
+        print(message, file = sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ setup(  name='YiFi',
         description='Just a .torrent 8K UHD database downloader for YTS Web Application.',
         packages=find_packages(),
         install_requires=['requests', 'argparse', 'tqdm', 'fake-useragent'],
+        extras_require={'async': ['aiohttp'], 'parquet': ['pyarrow'], 'posters': ['Pillow']},
         entry_points={'console_scripts': 'yifi = yifi.main:main'},
         # license=open('LICENSE').read(),
         keywords=['yts', 'YiFy','Blesslin Jerish R', 'scraper', 'media', 'download', 'downloader', 'torrent','yifi']
@@ -1 +1,11 @@
- 
+# The library API is loaded on first use, `yifi --help` and the CLI don't pay for requests
+_LIBRARY = ('Movie', 'Torrent', 'iter_movies', 'export_rows', 'write_magnets', 'download_torrents', 'drain', 'build_scraper')
+
+__all__ = list(_LIBRARY)
+
+
+def __getattr__(name):
+    if name in _LIBRARY:
+        from yifi import library
+        return getattr(library, name)
+    raise AttributeError(f"module 'yifi' has no attribute {name!r}")
@@ -0,0 +1,290 @@
+import sys
+import json
+import time
+import asyncio
+from urllib.parse import urlsplit
+from tqdm import tqdm
+from yifi.transport import Transport, backoff_delay
+from yifi.posters import poster_url
+
+# Optional dependency : pip install YiFi[async]
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncEngine:
+    """
+    AsyncEngine class - asyncio alternative to the thread pool
+
+    Runs the page / torrent / poster flow of `Scraper` on a single event
+    loop. A semaphore bounds the number of in-flight requests and every
+    file write is handed to a worker thread so the loop never blocks on
+    disk. Torrent selection, paths and CSV rows come from the scraper
+    itself, so both engines produce the same files.
+    """
+
+    def __init__(self, scraper, concurrency = 100):
+        if aiohttp is None:
+            raise ImportError("The async engine requires aiohttp. Install it with : pip install YiFi[async]")
+        self.scraper = scraper
+        self.concurrency = max(1, concurrency)
+        self.session = None
+        self.semaphore = None
+
+    def run(self):
+        asyncio.run(self.__main())
+
+    # GET with the retry policy of the sync transport
+    async def __get(self, url, headers = None):
+        transport = self.scraper.transport
+        stats = self.scraper.stats
+        cache = transport.cache
+        entry = await asyncio.to_thread(cache.lookup, url) if cache is not None else None
+        if entry is not None and (entry.fresh or transport.offline):
+            stats.count('cache_hits')
+            return entry.body
+        if transport.offline:
+            raise aiohttp.ClientConnectionError(f"Offline and not cached : {url}")
+        if entry is not None:
+            headers = dict(headers or {}, **entry.validators())
+
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            retry_after = None
+            status = None
+            size = 0
+            waited = time.perf_counter()
+            limit = await transport.limiter.acquire_async(url) if transport.limiter is not None else None
+            stats.add_time('rate_limit_wait', time.perf_counter() - waited)
+            started = time.perf_counter()
+            cancelled = False
+            try:
+                async with self.semaphore:
+                    started = time.perf_counter()
+                    async with self.session.get(url, headers = headers) as response:
+                        status = response.status
+                        if status == 304 and entry is not None:
+                            stats.count('cache_revalidated')
+                            await asyncio.to_thread(cache.revalidated, url)
+                            return entry.body
+                        if response.status not in Transport.RETRY_STATUSES:
+                            response.raise_for_status()
+                            body = await response.read()
+                            size = len(body)
+                            if cache is not None:
+                                await asyncio.to_thread(cache.store, url, body, response.headers)
+                            return body
+                        if attempt >= transport.retries:
+                            response.raise_for_status()
+                        retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= transport.retries:
+                    raise
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            finally:
+                # A cancelled task got no answer from the host, its slot is given back without a throttle
+                if cancelled:
+                    if limit is not None:
+                        limit.release()
+                else:
+                    if limit is not None:
+                        transport.limiter.feedback(limit, status)
+                    stats.request(host, time.perf_counter() - started, status, size)
+
+            delay = backoff_delay(attempt, retry_after, transport.backoff, transport.max_backoff)
+            stats.count('retries')
+            stats.add_time('retry_backoff', delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def __main(self):
+        scraper = self.scraper
+        transport = scraper.transport
+        connector = aiohttp.TCPConnector(limit = self.concurrency,
+                                         limit_per_host = scraper.per_host or self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect = transport.timeout,
+                                        sock_read = transport.timeout)
+
+        async with aiohttp.ClientSession(connector = connector, timeout = timeout) as session:
+            self.session = session
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+            # Connect to API & extract initial data
+            url = scraper._api_url()
+            try:
+                with scraper.stats.timer('page_fetch'):
+                    body = await self.__get(scraper._initial_url(), scraper._headers())
+            except aiohttp.ClientResponseError as errh:
+                print('HTTP Error : ', errh)
+                sys.exit(0)
+            except aiohttp.ClientConnectionError as errc:
+                print("Error Connecting : ", errc)
+                sys.exit(0)
+            except asyncio.TimeoutError as errt:
+                print("Timeout Error : ", errt)
+                sys.exit(0)
+            except aiohttp.ClientError as err:
+                print("There was an Error : ", err)
+                sys.exit(0)
+            with scraper.stats.timer('json_decode'):
+                data = json.loads(body)
+            scraper._read_api_data(data, url)
+
+            range_ = scraper._prepare_download()
+            try:
+                await self.__crawl(range_)
+                if scraper.scheduler is not None:
+                    # Every page is known, queued torrents go out in priority order
+                    jobs = iter(scraper.scheduler)
+                    await self.__run_tasks([asyncio.create_task(self.__job_worker(jobs))
+                                            for _ in range(self.concurrency)])
+                # Torrents cut by a budget are left for the next run
+                if not scraper.budget.cut:
+                    scraper._complete_run()
+            finally:
+                scraper._finish_download()
+        print("Download Finished")
+
+    # Page workers feed a bounded movie queue drained by the movie workers
+    async def __crawl(self, range_):
+        pages = iter(range_)
+        movies = asyncio.Queue(maxsize = self.concurrency * 2)
+
+        page_tasks = [asyncio.create_task(self.__page_worker(pages, movies))
+                      for _ in range(self.scraper.page_workers)]
+        movie_tasks = [asyncio.create_task(self.__movie_worker(movies))
+                       for _ in range(self.concurrency)]
+
+        # One sentinel per movie worker once every page is queued
+        async def close_queue():
+            await asyncio.gather(*page_tasks)
+            for _ in movie_tasks:
+                await movies.put(None)
+
+        await self.__run_tasks(page_tasks + movie_tasks + [asyncio.create_task(close_queue())])
+
+    # Waits for every task, the first error cancels the others and is raised
+    async def __run_tasks(self, tasks):
+        try:
+            done, pending = await asyncio.wait(tasks, return_when = asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions = True)
+
+    async def __page_worker(self, pages, movies):
+        # The page iterator is shared, every worker takes the next page
+        for page in pages:
+            page_response = self.scraper._cached_page(page)
+            if page_response is None:
+                url = "{}{}".format(self.scraper.url, str(page))
+                with self.scraper.stats.timer('page_fetch'):
+                    body = await self.__get(url, self.scraper._headers())
+                with self.scraper.stats.timer('json_decode'):
+                    page_response = json.loads(body)
+            for movie in self.scraper._start_page(page, self.scraper._page_movies(page_response)):
+                await movies.put(movie)
+            if self.scraper.paging_done:
+                break
+
+    async def __movie_worker(self, movies):
+        while True:
+            movie = await movies.get()
+            if movie is None:
+                return
+            await self.__filter_torrents(movie)
+
+    async def __filter_torrents(self, movie):
+        scraper = self.scraper
+        # Export rows are written while selecting, keep them off the loop
+        selection = await asyncio.to_thread(scraper._select_torrents, movie)
+        if selection is None:
+            await asyncio.to_thread(scraper._finish_movie, movie)
+            return
+        movie_name, selected = selection
+        # Metadata only : rows are exported while selecting
+        if scraper.csv_only:
+            # The bar is also moved by to_thread workers in __kept
+            with scraper.lock:
+                scraper.progress_bar.update()
+            await asyncio.to_thread(scraper._finish_movie, movie)
+            return
+
+        if scraper.scheduler is not None and selected:
+            if not scraper.scheduler.push(movie, movie_name, selected):
+                scraper.stats.skip('duplicate')
+            return
+
+        # A failed .torrent leaves the movie unfinished for --resume
+        failed = False
+        written_paths = []
+        for torrent, genres in selected:
+            paths = await self.__download_torrent(movie, movie_name, torrent, genres)
+            if paths is None:
+                failed = True
+                continue
+            written_paths += paths
+        await self.__movie_done(movie, written_paths, failed)
+
+    # Priority mode : pops queued torrents until the heap is empty
+    async def __job_worker(self, jobs):
+        for movie, movie_name, torrent, genres in jobs:
+            paths = await self.__download_torrent(movie, movie_name, torrent, genres)
+            result = self.scraper.scheduler.done(movie, paths or [], paths is None)
+            if result is not None:
+                await self.__movie_done(movie, *result)
+
+    # Written paths of one selected torrent, None when it wasn't fetched
+    async def __download_torrent(self, movie, movie_name, torrent, genres):
+        scraper = self.scraper
+        if not scraper.magnet and await asyncio.to_thread(scraper._existing_copies, movie, movie_name, torrent, genres):
+            return []
+        if not scraper._take_budget():
+            return None
+        if scraper.magnet:
+            return await asyncio.to_thread(scraper._save_magnet, movie, movie_name, torrent, genres)
+        try:
+            with scraper.stats.timer('torrent_fetch'):
+                bin_content_tor = await self.__get(torrent.get('url'))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            tqdm.write(f"Could not download {movie_name} {torrent.get('quality')} : {err}. Skipping ...")
+            scraper.stats.skip('fetch_failed')
+            scraper.budget.release()
+            return None
+        scraper.budget.spend(len(bin_content_tor))
+        return await asyncio.to_thread(scraper._save_torrent, movie, movie_name,
+                                       torrent, genres, bin_content_tor)
+
+    # Poster only once a .torrent is kept
+    async def __movie_done(self, movie, written_paths, failed):
+        scraper = self.scraper
+        if scraper.poster and scraper.resume:
+            written_paths += [path for path in await asyncio.to_thread(scraper._missing_posters, movie)
+                              if path not in written_paths]
+        if scraper.poster and written_paths:
+            image_url = poster_url(movie, scraper.poster_size)
+            try:
+                with scraper.stats.timer('poster_fetch'):
+                    bin_content_img = await self.__get(image_url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                tqdm.write(f"Could not download poster {image_url} : {err}. Skipping ...")
+            else:
+                scraper.budget.spend(len(bin_content_img))
+                # Decoding and resizing run in the process pool, not on the loop
+                try:
+                    with scraper.stats.timer('poster_process'):
+                        bin_content_img = await asyncio.wrap_future(scraper.posters.submit(bin_content_img))
+                except Exception as err:
+                    scraper._poster_failed(image_url, err)
+                else:
+                    await asyncio.to_thread(scraper._save_poster, movie, bin_content_img, written_paths)
+        if not failed:
+            await asyncio.to_thread(scraper._finish_movie, movie)
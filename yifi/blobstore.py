@@ -0,0 +1,113 @@
+import os
+import json
+import shutil
+import sqlite3
+import hashlib
+import threading
+from yifi.fsutil import write_atomic
+
+
+class BlobStore:
+    """
+    BlobStore class - Content-addressed store for .torrent files and posters
+
+    Every torrent is stored once under its infohash and every poster once
+    under the sha256 of its bytes. The category folders only hold hard
+    links ( or symlinks ) into the store, so a movie with four genres
+    costs one copy on disk. A SQLite manifest keeps the movie metadata
+    behind each blob, which is all `--relayout` needs to build another
+    folder layout without the network.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS movies (
+            movie_id    INTEGER PRIMARY KEY,
+            movie       TEXT,
+            poster      TEXT
+        );
+        CREATE TABLE IF NOT EXISTS torrents (
+            hash        TEXT PRIMARY KEY,
+            movie_id    INTEGER NOT NULL,
+            torrent     TEXT
+        );
+    """
+
+    def __init__(self, directory, link = 'hardlink'):
+        self.directory = directory
+        self.link_mode = link
+        os.makedirs(directory, exist_ok = True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, "store.db"),
+                                          check_same_thread = False, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    def blob_path(self, kind, key, extension):
+        return os.path.join(self.directory, kind, key[:2], key + extension)
+
+    # Writes the blob unless the store already has it
+    def __put(self, kind, key, extension, content):
+        path = self.blob_path(kind, key, extension)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            write_atomic(path, content)
+        return path
+
+    def __record_movie(self, movie):
+        # The torrent list lives in its own table
+        movie = {key: value for key, value in movie.items() if key != 'torrents'}
+        self.connection.execute("INSERT INTO movies (movie_id, movie) VALUES (?, ?) "
+                                "ON CONFLICT (movie_id) DO UPDATE SET movie = excluded.movie",
+                                (int(movie.get('id')), json.dumps(movie)))
+
+    def put_torrent(self, movie, torrent, content):
+        torrent_hash = (torrent.get('hash') or hashlib.sha256(content).hexdigest()).upper()
+        path = self.__put('torrents', torrent_hash, ".torrent", content)
+        with self.lock:
+            self.__record_movie(movie)
+            self.connection.execute("INSERT OR REPLACE INTO torrents VALUES (?, ?, ?)",
+                                    (torrent_hash, int(movie.get('id')), json.dumps(torrent)))
+        return path
+
+    def put_poster(self, movie, content, extension = ".jpg"):
+        key = hashlib.sha256(content).hexdigest()
+        path = self.__put('posters', key, extension, content)
+        with self.lock:
+            self.__record_movie(movie)
+            self.connection.execute("UPDATE movies SET poster = ? WHERE movie_id = ?",
+                                    (key + extension, int(movie.get('id'))))
+        return path
+
+    # Materialises a blob at target, hard links fall back to a copy across devices
+    def link(self, blob, target):
+        if os.path.lexists(target):
+            return
+        if self.link_mode == 'symlink':
+            os.symlink(os.path.relpath(blob, os.path.dirname(target) or os.path.curdir), target)
+            return
+        try:
+            os.link(blob, target)
+        except OSError:
+            shutil.copyfile(blob, target)
+
+    # ( movie, torrent, torrent blob, poster blob or None ) for every stored torrent
+    def entries(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT movies.movie, movies.poster, torrents.hash, torrents.torrent "
+                "FROM torrents JOIN movies ON movies.movie_id = torrents.movie_id "
+                "ORDER BY torrents.movie_id").fetchall()
+        for movie, poster, torrent_hash, torrent in rows:
+            poster_blob = None
+            if poster:
+                # Stores written before posters could be converted keep the bare key
+                key, extension = os.path.splitext(poster)
+                poster_blob = self.blob_path('posters', key, extension or ".jpg")
+            yield (json.loads(movie), json.loads(torrent),
+                   self.blob_path('torrents', torrent_hash, ".torrent"), poster_blob)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
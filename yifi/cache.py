@@ -0,0 +1,142 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from yifi.fsutil import write_atomic
+
+
+class CacheEntry:
+    """
+    CacheEntry class - Cached body with its validators
+    """
+
+    __slots__ = ('url', 'body', 'etag', 'last_modified', 'fresh')
+
+    def __init__(self, url, body, etag, last_modified, fresh):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    # Conditional request headers for revalidation
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    ResponseCache class - On-disk HTTP response cache keyed by URL
+
+    Bodies are stored as files named after the sha256 of the URL, their
+    validators and access times in a SQLite table next to them. Entries
+    younger than `ttl` are served without a request, older ones are
+    revalidated with If-None-Match / If-Modified-Since. Once the cache
+    grows past `max_bytes` the least recently used entries are evicted.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key             TEXT PRIMARY KEY,
+            url             TEXT,
+            etag            TEXT,
+            last_modified   TEXT,
+            stored_at       REAL,
+            accessed_at     REAL,
+            size            INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+    """
+
+    def __init__(self, directory, ttl = 3600, max_bytes = 1 << 30):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok = True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, "cache.db"),
+                                          check_same_thread = False, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def __key(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def lookup(self, url):
+        key = self.__key(url)
+        with self.lock:
+            row = self.connection.execute("SELECT etag, last_modified, stored_at FROM entries WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self.__path(key), "rb") as body:
+                    content = body.read()
+            except OSError:
+                # Body evicted or removed by hand, forget the row too
+                self.__delete(key)
+                return None
+            now = time.time()
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        etag, last_modified, stored_at = row
+        return CacheEntry(url, content, etag, last_modified, now - stored_at < self.ttl)
+
+    def store(self, url, body, headers):
+        key = self.__key(url)
+        path = self.__path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        # A cache needs no fsync, and the body is written before the lock so workers don't queue on the disk
+        write_atomic(path, body, durable = False)
+        with self.lock:
+            old = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (key, url, headers.get('ETag'), headers.get('Last-Modified'),
+                                     now, now, len(body)))
+            self.size += len(body) - (old[0] if old else 0)
+            self.__evict()
+
+    # 304 Not Modified : the cached body is fresh again
+    def revalidated(self, url):
+        with self.lock:
+            now = time.time()
+            self.connection.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                    (now, now, self.__key(url)))
+
+    def __delete(self, key):
+        row = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if row:
+            self.size -= row[0]
+        try:
+            os.remove(self.__path(key))
+        except OSError:
+            pass
+
+    # Least recently used first until the cache fits again
+    def __evict(self):
+        while self.size > self.max_bytes:
+            rows = self.connection.execute("SELECT key FROM entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                break
+            for (key,) in rows:
+                self.__delete(key)
+                if self.size <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
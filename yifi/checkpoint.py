@@ -0,0 +1,114 @@
+import time
+import sqlite3
+import threading
+
+
+class Checkpoint:
+    """
+    Checkpoint class - Completed pages and movies of the running crawl
+
+    A movie is checkpointed once every stage is done with it, a page once
+    all of its movies are. Both are committed to SQLite as they complete,
+    so after a crash `--resume` skips the finished pages without a request
+    and drops the finished movies from the pages it fetches again. Only
+    one crawl is tracked per state file, `key` tells whether a resumed
+    run asks for the same query.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            key             TEXT PRIMARY KEY,
+            started_at      REAL,
+            newest_added    INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            page            INTEGER PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS movies (
+            movie_id        INTEGER PRIMARY KEY
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+        self.pages = set()
+        self.movies = set()
+        self.newest_added = None
+        # Page -> movie ids still running, movie id -> pages it was listed on
+        self.__pending = {}
+        self.__movie_pages = {}
+
+    # Continues the checkpointed crawl of the same key, anything else starts over
+    def begin(self, key, resume = False):
+        with self.lock:
+            row = self.connection.execute("SELECT key, newest_added FROM runs").fetchone()
+            if resume and row is not None and row[0] == key:
+                self.newest_added = row[1]
+                self.pages = {page for (page,) in self.connection.execute("SELECT page FROM pages")}
+                self.movies = {movie_id for (movie_id,) in self.connection.execute("SELECT movie_id FROM movies")}
+                return True
+            self.__clear()
+            self.connection.execute("INSERT INTO runs VALUES (?, ?, NULL)", (key, time.time()))
+            return False
+
+    # Registers a fetched page, returns its movies that aren't finished yet
+    def start_page(self, page, movies, newest_added = None):
+        movies = [movie for movie in movies or [] if int(movie.get('id')) not in self.movies]
+        with self.lock:
+            if newest_added is not None and newest_added != self.newest_added:
+                self.newest_added = newest_added
+                self.connection.execute("UPDATE runs SET newest_added = ?", (newest_added,))
+            if not movies:
+                self.__page_done(page)
+                return movies
+            pending = self.__pending.setdefault(page, set())
+            for movie in movies:
+                movie_id = int(movie.get('id'))
+                pending.add(movie_id)
+                self.__movie_pages.setdefault(movie_id, set()).add(page)
+        return movies
+
+    def finish_movie(self, movie_id):
+        movie_id = int(movie_id)
+        with self.lock:
+            if movie_id not in self.movies:
+                self.movies.add(movie_id)
+                self.connection.execute("INSERT OR IGNORE INTO movies VALUES (?)", (movie_id,))
+            for page in self.__movie_pages.pop(movie_id, ()):
+                pending = self.__pending.get(page)
+                if pending is None:
+                    continue
+                pending.discard(movie_id)
+                if not pending:
+                    del self.__pending[page]
+                    self.__page_done(page)
+
+    def __page_done(self, page):
+        if page not in self.pages:
+            self.pages.add(page)
+            self.connection.execute("INSERT OR IGNORE INTO pages VALUES (?)", (page,))
+
+    def __clear(self):
+        self.connection.execute("DELETE FROM runs")
+        self.connection.execute("DELETE FROM pages")
+        self.connection.execute("DELETE FROM movies")
+        self.pages = set()
+        self.movies = set()
+        self.newest_added = None
+
+    # The crawl finished, nothing is left to resume
+    def complete(self):
+        with self.lock:
+            self.__clear()
+            self.__pending.clear()
+            self.__movie_pages.clear()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,196 @@
+import os
+import csv
+import json
+import threading
+
+# Columns of an exported row : every movie field of list_movies.json,
+# every field of the torrent ( prefixed ) and the locally built magnet link
+MOVIE_FIELDS = [
+    ('id', 'int'), ('url', 'str'), ('imdb_code', 'str'), ('title', 'str'),
+    ('title_english', 'str'), ('title_long', 'str'), ('slug', 'str'), ('year', 'int'),
+    ('rating', 'float'), ('runtime', 'int'), ('genres', 'list'), ('summary', 'str'),
+    ('description_full', 'str'), ('synopsis', 'str'), ('yt_trailer_code', 'str'),
+    ('language', 'str'), ('mpa_rating', 'str'), ('background_image', 'str'),
+    ('background_image_original', 'str'), ('small_cover_image', 'str'),
+    ('medium_cover_image', 'str'), ('large_cover_image', 'str'), ('state', 'str'),
+    ('date_uploaded', 'str'), ('date_uploaded_unix', 'int'),
+]
+TORRENT_FIELDS = [
+    ('url', 'str'), ('hash', 'str'), ('quality', 'str'), ('type', 'str'),
+    ('is_repack', 'str'), ('video_codec', 'str'), ('bit_depth', 'str'),
+    ('audio_channels', 'str'), ('seeds', 'int'), ('peers', 'int'), ('size', 'str'),
+    ('size_bytes', 'int'), ('date_uploaded', 'str'), ('date_uploaded_unix', 'int'),
+]
+COLUMNS = ([(name, kind) for name, kind in MOVIE_FIELDS]
+           + [('torrent_' + name, kind) for name, kind in TORRENT_FIELDS]
+           + [('magnet', 'str')])
+
+FORMATS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+
+
+# Flat row for one torrent of a movie
+def torrent_row(movie, torrent, magnet = None):
+    row = {name: movie.get(name) for name, kind in MOVIE_FIELDS}
+    row.update({'torrent_' + name: torrent.get(name) for name, kind in TORRENT_FIELDS})
+    row['magnet'] = magnet
+    return row
+
+
+class CsvWriter:
+    """
+    CsvWriter class - Appends rows to a single buffered CSV file
+
+    Rows are only appended under the same header. A file with other
+    columns ( such as the 10 column CSV of older versions ) is left
+    alone and the rows go to name-2.csv, name-3.csv ... instead.
+    """
+
+    def __init__(self, path):
+        fieldnames = [name for name, kind in COLUMNS]
+        self.path = self.__free_path(path, fieldnames)
+        if self.path != path:
+            print(f"{path} has other columns, exporting to {self.path} instead.")
+        self.file = open(self.path, mode = 'a', newline = '', encoding = 'utf-8', buffering = 1 << 16)
+        self.writer = csv.DictWriter(self.file, delimiter = ',', lineterminator = '\n', quotechar = '"',
+                                     quoting = csv.QUOTE_ALL, fieldnames = fieldnames)
+        # Header only for a new file
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    # First of path, name-2.csv, name-3.csv ... that is empty or has the same header
+    @staticmethod
+    def __free_path(path, fieldnames):
+        stem, extension = os.path.splitext(path)
+        candidate, number = path, 1
+        while True:
+            try:
+                with open(candidate, newline = '', encoding = 'utf-8') as file:
+                    header = next(csv.reader(file), None)
+            except FileNotFoundError:
+                return candidate
+            if header is None or header == fieldnames:
+                return candidate
+            number += 1
+            candidate = f"{stem}-{number}{extension}"
+
+    def write(self, row):
+        row = dict(row)
+        row['genres'] = "|".join(row.get('genres') or [])
+        self.writer.writerow(row)
+
+    def sync(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+    """
+    JsonlWriter class - Appends one JSON object per line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, mode = 'a', encoding = 'utf-8', buffering = 1 << 16)
+
+    def write(self, row):
+        self.file.write(json.dumps(row, ensure_ascii = False) + "\n")
+
+    def sync(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    ParquetWriter class - Writes row groups of `batch_size` rows with pyarrow
+
+    Parquet files can't be appended to, every run rewrites the file.
+    """
+
+    def __init__(self, path, batch_size = 5000):
+        # Optional dependency : pip install YiFi[parquet]
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow. Install it with : pip install YiFi[parquet]")
+        self.pa = pyarrow
+        types = {'int': pyarrow.int64(), 'float': pyarrow.float64(),
+                 'str': pyarrow.string(), 'list': pyarrow.list_(pyarrow.string())}
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS])
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, row):
+        # The API is loose with types ( "is_repack" : "0" ), normalise to the schema
+        self.rows.append({name: _coerce(row.get(name), kind) for name, kind in COLUMNS})
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    # Row groups are only written per batch, the file is rewritten by every run anyway
+    def sync(self):
+        pass
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema = self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def _coerce(value, kind):
+    if value is None or value == '':
+        return None
+    try:
+        if kind == 'int':
+            return int(value)
+        if kind == 'float':
+            return float(value)
+        if kind == 'list':
+            return [str(item) for item in value]
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Exporter:
+    """
+    Exporter class - Single thread safe writer shared by every worker
+    """
+
+    WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter}
+
+    def __init__(self, format, path):
+        self.format = format
+        self.path = path
+        self.rows = 0
+        self.lock = threading.Lock()
+        self.writer = self.WRITERS[format](path)
+        # The CSV writer may pick another file next to path
+        self.path = self.writer.path
+
+    def write(self, movie, torrent, magnet = None):
+        self.write_row(torrent_row(movie, torrent, magnet))
+
+    def write_row(self, row):
+        with self.lock:
+            self.writer.write(row)
+            self.rows += 1
+
+    # Buffered rows reach the file before a movie is checkpointed
+    def sync(self):
+        with self.lock:
+            self.writer.sync()
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
@@ -0,0 +1,25 @@
+import os
+import threading
+
+
+# Writes through a temp file in the target folder, fsyncs it and renames it
+# over the target. A crash leaves the old file or the new one, never a
+# truncated one, and the hidden temp name never passes for a finished file.
+# durable = False skips the fsync for files that may be lost, such as caches
+def write_atomic(path, content, durable = True):
+    directory, name = os.path.split(path)
+    temp = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.part")
+    descriptor = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(content)
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
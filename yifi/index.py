@@ -0,0 +1,82 @@
+import json
+import time
+import sqlite3
+import threading
+
+
+class DownloadIndex:
+    """
+    DownloadIndex class - Persistent record of every downloaded .torrent
+
+    Backed by SQLite in WAL mode so reruns can skip what is already on
+    disk without touching the filesystem or the network. Known hashes are
+    loaded into a set when the index is opened, which keeps every skip
+    check O(1). One connection is shared by all workers behind a lock.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS torrents (
+            hash        TEXT PRIMARY KEY,
+            movie_id    INTEGER NOT NULL,
+            imdb_code   TEXT,
+            quality     TEXT,
+            paths       TEXT,
+            size        INTEGER,
+            fetched_at  REAL
+        );
+        CREATE INDEX IF NOT EXISTS torrents_movie_id ON torrents (movie_id);
+        CREATE TABLE IF NOT EXISTS meta (
+            key         TEXT PRIMARY KEY,
+            value       TEXT
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+        self.hashes = {row[0] for row in self.connection.execute("SELECT hash FROM torrents")}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, torrent_hash):
+        return bool(torrent_hash) and torrent_hash.upper() in self.hashes
+
+    def record(self, movie_id, torrent_hash, quality, paths, size, imdb_code = None, fetched_at = None):
+        if not torrent_hash:
+            return
+        torrent_hash = torrent_hash.upper()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO torrents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (torrent_hash, int(movie_id), imdb_code, quality, json.dumps(paths), size,
+                 fetched_at or time.time()))
+            self.hashes.add(torrent_hash)
+
+    def get(self, torrent_hash):
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM torrents WHERE hash = ?",
+                                          (torrent_hash.upper(),)).fetchone()
+        if row is None:
+            return None
+        return {'hash': row[0], 'movie_id': row[1], 'imdb_code': row[2], 'quality': row[3],
+                'paths': json.loads(row[4] or '[]'), 'size': row[5], 'fetched_at': row[6]}
+
+    # Small key / value store for run state such as the date_added watermark
+    def get_meta(self, key, default = None):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,187 @@
+import os
+from yifi.planner import QueryPlan
+from yifi.transport import Transport
+from yifi.ratelimit import RateLimiter
+from yifi.magnet import magnet_uri
+from yifi.export import MOVIE_FIELDS, TORRENT_FIELDS, Exporter
+from yifi.fsutil import write_atomic
+from yifi.useragent import UserAgentPool
+
+API_URL = 'https://yts.mx/api/v2/'
+
+# Shared by every iter_movies, filled on the first request
+_user_agents = UserAgentPool()
+
+
+class Torrent:
+    """
+    Torrent class - One torrent of a movie
+    """
+
+    __slots__ = tuple(name for name, kind in TORRENT_FIELDS)
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Torrent({self.quality!r}, {self.hash!r})"
+
+
+class Movie:
+    """
+    Movie class - Compact record of a list_movies.json movie
+
+    Slots instead of the API's dict, genres and torrents as tuples.
+    `as_dict` gives back the shape the scraper and the exporters use.
+    """
+
+    __slots__ = tuple(name for name, kind in MOVIE_FIELDS) + ('torrents',)
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        self.genres = tuple(self.genres or ())
+        self.torrents = tuple(self.torrents or ())
+
+    @classmethod
+    def from_api(cls, movie, torrents = None):
+        fields = dict(movie)
+        fields['torrents'] = [Torrent(**torrent) for torrent in
+                              (movie.get('torrents') or [] if torrents is None else torrents)]
+        return cls(**fields)
+
+    # Title used for file names, without the characters Windows rejects
+    @property
+    def name(self):
+        return (self.title_long or self.title or str(self.id)).translate({ord(i): None for i in "'/\\:*?<>|"})
+
+    def magnet(self, torrent):
+        return magnet_uri(torrent.hash, f"{self.name} [{torrent.quality}] [YTS.MX]")
+
+    def as_dict(self):
+        movie = {name: getattr(self, name) for name in self.__slots__}
+        movie['genres'] = list(self.genres)
+        movie['torrents'] = [torrent.as_dict() for torrent in self.torrents]
+        return movie
+
+    def __repr__(self):
+        return f"Movie({self.id!r}, {self.title_long!r}, {len(self.torrents)} torrents)"
+
+
+# Lazily pages through list_movies.json and yields the matching movies one by one
+def iter_movies(api_url = API_URL, page = 1, transport = None, limit = 50, **filters):
+    """
+    Streams the catalog as `Movie` records, one page in memory at a time.
+
+    `filters` are the arguments of `QueryPlan` : quality, genres,
+    minimum_rating, year_limit, languages, min_seeds and sort_by.
+    Movies only keep their matching torrents, movies without any are
+    skipped, and paging stops early when the plan has a cutoff.
+    """
+    plan = QueryPlan(**filters)
+    url = plan.url(api_url, limit)
+    # A private transport when none is shared, closed with the generator
+    own_transport = transport is None
+    if own_transport:
+        transport = Transport(pool_size = 2, limiter = RateLimiter(api_concurrency = 1, concurrency = 1))
+    seen = set()
+    try:
+        while True:
+            data = transport.get(url + str(page), headers = _user_agents.headers()).json().get('data') or {}
+            movies = data.get('movies')
+            if not movies:
+                return
+            for movie in movies:
+                # Movies shift between pages while the catalog grows
+                if movie.get('id') in seen or plan.movie_reject(movie) is not None:
+                    continue
+                seen.add(movie.get('id'))
+                torrents = [torrent for torrent in movie.get('torrents') or [] if plan.torrent_reject(torrent) is None]
+                if torrents:
+                    yield Movie.from_api(movie, torrents)
+            if plan.past_cutoff(movies[-1]) or page * limit >= (data.get('movie_count') or 0):
+                return
+            page += 1
+    finally:
+        if own_transport:
+            transport.close()
+
+
+# Pass-through sinks : each consumes movies, acts on them and yields them on,
+# so they chain e.g. drain(write_magnets(export_rows(iter_movies(...), path), path))
+
+def export_rows(movies, path, format = 'csv'):
+    exporter = Exporter(format, path)
+    try:
+        for movie in movies:
+            row = movie.as_dict()
+            for torrent in movie.torrents:
+                exporter.write(row, torrent.as_dict(), movie.magnet(torrent) if torrent.hash else None)
+            yield movie
+    finally:
+        exporter.close()
+
+
+def write_magnets(movies, path):
+    with open(path, "a") as magnets:
+        for movie in movies:
+            for torrent in movie.torrents:
+                if torrent.hash:
+                    magnets.write(movie.magnet(torrent) + "\n")
+            yield movie
+
+
+def download_torrents(movies, directory, transport = None):
+    own_transport = transport is None
+    if own_transport:
+        transport = Transport(pool_size = 2, limiter = RateLimiter())
+    os.makedirs(directory, exist_ok = True)
+    try:
+        for movie in movies:
+            for torrent in movie.torrents:
+                path = os.path.join(directory, f"{movie.name} {torrent.quality}.torrent")
+                if not os.path.isfile(path):
+                    write_atomic(path, transport.get(torrent.url).content)
+            yield movie
+    finally:
+        if own_transport:
+            transport.close()
+
+
+# Consumes a chain of sinks, returns the number of movies
+def drain(movies):
+    count = 0
+    for count, movie in enumerate(movies, 1):
+        pass
+    return count
+
+
+# Scraper from keyword options instead of an argparse Namespace,
+# options are the dest names of the yifi arguments e.g. output, quality, magnet.
+# Strings go through the argument's type as on the command line : genre = 'action,sci-fi', max_bytes = '500M'
+def build_scraper(**options):
+    import argparse
+    from yifi.main import build_parser
+    from yifi.scraper import Scraper
+
+    parser = build_parser()
+    args = parser.parse_args([])
+    actions = {action.dest: action for action in parser._actions}
+    for name, value in options.items():
+        if not hasattr(args, name):
+            raise TypeError(f"Unknown yifi option {name!r}")
+        action = actions.get(name)
+        if action is not None and isinstance(value, str):
+            try:
+                value = action.type(value) if callable(action.type) else value
+            except (argparse.ArgumentTypeError, TypeError, ValueError) as err:
+                raise ValueError(f"Invalid value {value!r} for yifi option {name!r} : {err}") from None
+            if action.choices is not None and value not in action.choices:
+                raise ValueError(f"Invalid value {value!r} for yifi option {name!r}, "
+                                 f"choose from {', '.join(map(str, action.choices))}")
+        setattr(args, name, value)
+    return Scraper(args)
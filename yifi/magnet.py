@@ -0,0 +1,19 @@
+from urllib.parse import quote_plus
+
+# Trackers YTS lists for its magnet links
+YTS_TRACKERS = [
+    'udp://open.demonii.com:1337/announce',
+    'udp://tracker.openbittorrent.com:80',
+    'udp://tracker.coppersurfer.tk:6969',
+    'udp://glotorrents.pw:6969/announce',
+    'udp://tracker.opentrackr.org:1337/announce',
+    'udp://torrent.gresille.org:80/announce',
+    'udp://p4p.arenabg.com:1337',
+    'udp://tracker.leechers-paradise.org:6969',
+]
+
+
+# Magnet URI built from the infohash, no request needed
+def magnet_uri(torrent_hash, name, trackers = YTS_TRACKERS):
+    uri = f"magnet:?xt=urn:btih:{torrent_hash.upper()}&dn={quote_plus(name)}"
+    return uri + "".join(f"&tr={quote_plus(tracker)}" for tracker in trackers)
@@ -1,12 +1,62 @@
+import os
+import sys
+import time
 import argparse
 import traceback
-from yifi.scraper import Scraper
+from yifi.planner import GENRES
+from yifi.scheduler import PRIORITY_KEYS
 
-def main():
-    """YiFi - .torrent database downloader for
-       Web Appplication ( yts.com ) 
-    """
-    
+# "i/n" of --shard, shards are numbered from 1
+def shard_spec(value):
+    try:
+        shard, shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/n, got {value!r}")
+    if not 1 <= shard <= shards:
+        raise argparse.ArgumentTypeError(f"shard {shard} is not between 1 and {shards}")
+    return shard, shards
+
+# Comma separated genres of -g, "all" or nothing else
+def genre_list(value):
+    genres = [genre.strip() for genre in value.lower().split(',') if genre.strip()]
+    for genre in genres:
+        if genre != 'all' and genre not in GENRES:
+            raise argparse.ArgumentTypeError(f"invalid genre {genre!r}")
+    return [genre for genre in genres if genre != 'all']
+
+# "key" or "key:asc" of --priority, highest first by default
+def priority_key(value):
+    key, _, order = value.lower().partition(':')
+    if key not in PRIORITY_KEYS:
+        raise argparse.ArgumentTypeError(f"invalid priority {key!r}, choose from {', '.join(PRIORITY_KEYS)}")
+    if order not in ('', 'asc', 'desc'):
+        raise argparse.ArgumentTypeError(f"invalid order {order!r}, use asc or desc")
+    return key, order or 'desc'
+
+# Bytes with an optional K, M or G suffix e.g. 500M
+def byte_size(value):
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = value.strip().lower().rstrip('b')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size like 500M, got {value!r}")
+
+# Seconds with an optional s, m or h suffix e.g. 90m
+def duration(value):
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    value = value.strip().lower()
+    try:
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a duration like 90m, got {value!r}")
+
+# Argument parser of the yifi command
+def build_parser():
     desc = "YiFi - .torrent database downloader for yts.com"
     parser = argparse.ArgumentParser(description=desc)
     parser.add_argument('-o', '--output',
@@ -41,17 +91,13 @@ def main():
                                                      "horror", "music", "musical", "mystery", "news",
                                                      "reality-tv", "romance", "sci-fi", "sport",
                                                      "talk-show", "thriller", "war", "western",
+                        Several genres are separated by commas, e.g. action,sci-fi
                         """,
                         dest = 'genre',
-                        type = str.lower,
+                        type = genre_list,
                         required = False,
-                        choices = ['all', 'action', 'adventure', 'animation', 'biography',
-                                 'comedy', 'crime', 'documentary', 'drama', 'family',
-                                 'fantasy', 'film-noir', 'game-show', 'history', 'horror',
-                                 'music', 'musical', 'mystery', 'news', 'reality-tv', 'romance',
-                                 'sci-fi', 'sport', 'talk-show', 'thriller', 'war', 'western'],
-                        default = 'all',
-                        const = 'all',
+                        default = [],
+                        const = [],
                         nargs = '?'
                         )
     
@@ -69,13 +115,15 @@ def main():
                         help = """/folder structure.
                                     Valid arguments are: 'title', 'year', 'rating', 'latest', 'peers',
                                  'seeds', 'download_count', 'like_count', 'date_added'
+                                 Defaults to 'latest', or to the order that lets --year-limit
+                                 and --min-seeds stop paging early.
                         """,
                         dest = 'sort_by',
                         type = str.lower,
                         required = False,
                         choices=['title', 'year', 'rating', 'latest', 'peers',
                                  'seeds', 'download_count', 'like_count', 'date_added'],
-                        default='latest',
+                        default=None,
                         const='latest',
                         nargs='?'
                         )
@@ -102,6 +150,22 @@ def main():
                         const='0',
                         nargs='?')
 
+    parser.add_argument('--language',
+                        help = 'Only movies in these languages, comma separated ISO codes e.g. en,fr',
+                        dest = 'language',
+                        type = lambda value: [language.strip().lower() for language in value.split(',') if language.strip()],
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--min-seeds',
+                        help = 'Only .torrents with at least this many seeds.',
+                        dest = 'min_seeds',
+                        type = int,
+                        required = False,
+                        default = 0
+                        )
+
     parser.add_argument('-b', '--background',
                         help='''append -b to download movie posters.
                                 This will pack .torrent file and the image together in a folder.
@@ -112,6 +176,48 @@ def main():
                         default=False,
                         const=True,
                         nargs='?')
+
+    parser.add_argument('--poster-size',
+                        help = 'Cover fetched by -b : small, medium or large ( default ).',
+                        dest = 'poster_size',
+                        type = str.lower,
+                        required = False,
+                        choices = ['small', 'medium', 'large'],
+                        default = 'large'
+                        )
+
+    parser.add_argument('--poster-width',
+                        help = 'Shrink posters wider than this many pixels, keeping the aspect ratio. Requires Pillow.',
+                        dest = 'poster_width',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--poster-format',
+                        help = "Poster file format : 'jpg' ( default, stored as fetched unless resized ) or 'webp' ( requires Pillow ).",
+                        dest = 'poster_format',
+                        type = str.lower,
+                        required = False,
+                        choices = ['jpg', 'webp'],
+                        default = 'jpg'
+                        )
+
+    parser.add_argument('--poster-quality',
+                        help = 'Encoder quality of resized or converted posters, 1 to 100.',
+                        dest = 'poster_quality',
+                        type = int,
+                        required = False,
+                        default = 80
+                        )
+
+    parser.add_argument('--poster-processes',
+                        help = 'Number of processes resizing and converting posters. Default : one per CPU.',
+                        dest = 'poster_processes',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
     
     parser.add_argument('-i', '--imdb',
                         help = 'append -i to append IMDB ID to filename.',
@@ -137,19 +243,379 @@ def main():
                         nargs = '?'
                         )
     
-    parser.add_argument('--csv--only',
+    parser.add_argument('--page-workers',
+                        help = 'Number of threads fetching API pages ahead of the downloads.',
+                        dest = 'page_workers',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--torrent-workers',
+                        help = 'Number of threads downloading .torrent files.',
+                        dest = 'torrent_workers',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--poster-workers',
+                        help = 'Number of threads downloading movie posters.',
+                        dest = 'poster_workers',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--queue-size',
+                        help = 'Max number of fetched pages waiting for the torrent workers.',
+                        dest = 'queue_size',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--engine',
+                        help = """
+                            Download engine. Valid arguments are :
+                                'thread' ( default ) , 'async' ( requires aiohttp )
+                        """,
+                        dest = 'engine',
+                        type = str.lower,
+                        required = False,
+                        choices = ['thread', 'async'],
+                        default = 'thread'
+                        )
+
+    parser.add_argument('--concurrency',
+                        help = 'Max in-flight requests of the async engine.',
+                        dest = 'concurrency',
+                        type = int,
+                        required = False,
+                        default = 100
+                        )
+
+    parser.add_argument('--per-host',
+                        help = 'Max in-flight requests to a single host. Defaults to the pool size.',
+                        dest = 'per_host',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--retries',
+                        help = 'Retries for timeouts, connection errors, 429 and 5xx responses.',
+                        dest = 'retries',
+                        type = int,
+                        required = False,
+                        default = 3
+                        )
+
+    parser.add_argument('--backoff',
+                        help = 'Base delay in seconds of the jittered exponential backoff.',
+                        dest = 'backoff',
+                        type = float,
+                        required = False,
+                        default = 0.5
+                        )
+
+    parser.add_argument('--rate',
+                        help = 'Starting requests per second for torrents and posters. Adapts to the server.',
+                        dest = 'rate',
+                        type = float,
+                        required = False,
+                        default = 10
+                        )
+
+    parser.add_argument('--api-rate',
+                        help = 'Starting requests per second for API pages. Adapts to the server.',
+                        dest = 'api_rate',
+                        type = float,
+                        required = False,
+                        default = 2
+                        )
+
+    parser.add_argument('--max-rate',
+                        help = 'Ceiling of the adaptive rate in requests per second.',
+                        dest = 'max_rate',
+                        type = float,
+                        required = False,
+                        default = 50
+                        )
+
+    parser.add_argument('--index',
+                        help = 'Path of the SQLite download index. Defaults to yifi-index.db in the output folder.',
+                        dest = 'index',
+                        type = str,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--no-index',
+                        help = 'append --no-index to ignore the download index and re-check every .torrent.',
+                        dest = 'no_index',
+                        type = bool,
+                        required = False,
+                        default = False,
+                        const = True,
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--resume',
+                        help = 'append --resume to continue the crashed or interrupted crawl of the same keys where it stopped.',
+                        dest = 'resume',
+                        type = bool,
+                        required = False,
+                        default = False,
+                        const = True,
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--state',
+                        help = 'Path of the crawl checkpoint. Defaults to yifi-state.db in the output folder.',
+                        dest = 'state',
+                        type = str,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--since-last-run',
+                        help = """
+                            append --since-last-run to only crawl movies added since the last completed run.
+                                Pages are walked newest first and paging stops at the first older movie.
+                        """,
+                        dest = 'since_last_run',
+                        type = bool,
+                        required = False,
+                        default = False,
+                        const = True,
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--watch',
+                        help = 'Keep running and check for new movies every given number of seconds.',
+                        dest = 'watch',
+                        type = int,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--magnet',
+                        help = """
+                            append --magnet to write magnet links instead of downloading .torrent files.
+                                Valid arguments are : 'files' ( .magnet next to where the .torrent would be ) ,
+                                'list' ( a single magnets.txt in the output folder )
+                        """,
+                        dest = 'magnet',
+                        type = str.lower,
+                        required = False,
+                        choices = ['files', 'list'],
+                        default = None,
+                        const = 'files',
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--cache',
+                        help = 'append --cache to cache API pages, posters and .torrent files on disk. Defaults to ~/.cache/yifi.',
+                        dest = 'cache',
+                        type = str,
+                        required = False,
+                        default = None,
+                        const = os.path.join('~', '.cache', 'yifi'),
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--cache-ttl',
+                        help = 'Seconds a cached response is served without revalidation.',
+                        dest = 'cache_ttl',
+                        type = int,
+                        required = False,
+                        default = 3600
+                        )
+
+    parser.add_argument('--cache-size',
+                        help = 'Max size of the cache in MB, least recently used entries are evicted first.',
+                        dest = 'cache_size',
+                        type = int,
+                        required = False,
+                        default = 1024
+                        )
+
+    parser.add_argument('--offline',
+                        help = 'append --offline to replay purely from the cache without any request.',
+                        dest = 'offline',
+                        type = bool,
+                        required = False,
+                        default = False,
+                        const = True,
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--store',
+                        help = """
+                            append --store to keep every .torrent and poster once in a content-addressed store
+                                ( defaults to .yifi-store ) and only link them into the category folders.
+                        """,
+                        dest = 'store',
+                        type = str,
+                        required = False,
+                        default = None,
+                        const = '.yifi-store',
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--pack',
                         help = """
-                            append --csv to log scraped data ONLY to a CSV file.
-                                With this argument .torrent files will not be downloaded
+                            append --pack to write the .torrent files and posters into one SQLite pack
+                                ( defaults to yifi-pack.db in the output folder ) instead of the folder layout.
+                                List it with yifi ls and materialise it with yifi extract.
+                        """,
+                        dest = 'pack',
+                        type = str,
+                        required = False,
+                        default = None,
+                        const = '',
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--link',
+                        help = "How the category folders point into the store. Valid arguments are : 'hardlink', 'symlink'",
+                        dest = 'link',
+                        type = str.lower,
+                        required = False,
+                        choices = ['hardlink', 'symlink'],
+                        default = 'hardlink'
+                        )
+
+    parser.add_argument('--relayout',
+                        help = 'append --relayout to rebuild the folders for the given keys from the store, without the network.',
+                        dest = 'relayout',
+                        type = bool,
+                        required = False,
+                        default = False,
+                        const = True,
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--csv--only', '--metadata-only',
+                        help = """
+                            append --csv--only to ONLY export the scraped metadata ( see --export ).
+                                With this argument no .torrent file or poster is requested.
                         """,
                         dest = 'csv_only',
                         type = bool,
                         required = False,
-                        default = 1,
-                        const = 1,
+                        default = False,
+                        const = True,
                         nargs = '?'
                         )
 
+    parser.add_argument('--export',
+                        help = """
+                            Format of the metadata export, one row per torrent. Valid arguments are :
+                                'csv', 'jsonl', 'parquet' ( requires pyarrow )
+                        """,
+                        dest = 'export',
+                        type = str.lower,
+                        required = False,
+                        choices = ['csv', 'jsonl', 'parquet'],
+                        default = 'csv'
+                        )
+
+    parser.add_argument('--export-path',
+                        help = 'Path of the metadata export. Defaults to YiFi-Scraper.<format> in the current folder.',
+                        dest = 'export_path',
+                        type = str,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--stats',
+                        help = """
+                            append --stats to print timings per phase, request counters, skips and
+                                per host latencies at exit. Valid arguments are : 'text' ( default ) , 'json'
+                        """,
+                        dest = 'stats',
+                        type = str.lower,
+                        required = False,
+                        choices = ['text', 'json'],
+                        default = None,
+                        const = 'text',
+                        nargs = '?'
+                        )
+
+    parser.add_argument('--stats-interval',
+                        help = 'Also dump the stats every given number of seconds during the run.',
+                        dest = 'stats_interval',
+                        type = float,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--stats-hook',
+                        help = 'module:function called with every stats snapshot, e.g. for a metrics exporter. Repeatable.',
+                        dest = 'stats_hook',
+                        action = 'append',
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--shard',
+                        help = 'i/n : only crawl the i-th of n shares of the crawl, e.g. 2/4. Combine the shards with yifi merge.',
+                        dest = 'shard',
+                        type = shard_spec,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--shard-by',
+                        help = """
+                            How --shard splits the crawl. Valid arguments are :
+                                'page' ( contiguous page ranges, no page is fetched twice ) ,
+                                'movie' ( movie id modulo n, every shard reads every page but stays exact when the catalog shifts )
+                        """,
+                        dest = 'shard_by',
+                        type = str.lower,
+                        required = False,
+                        choices = ['page', 'movie'],
+                        default = 'page'
+                        )
+
+    parser.add_argument('--priority',
+                        help = f"""
+                            Read every page first, then download the .torrentz ordered by this key instead of page order.
+                            Valid keys are : {', '.join(PRIORITY_KEYS)} , highest first, append :asc for lowest first e.g. size:asc
+                        """,
+                        dest = 'priority',
+                        type = priority_key,
+                        required = False,
+                        default = None
+                        )
+
+    parser.add_argument('--max-bytes',
+                        help = 'Stop downloading once the .torrentz and posters of this run reach this size e.g. 500M.',
+                        dest = 'max_bytes',
+                        type = byte_size,
+                        required = False,
+                        default = 0
+                        )
+
+    parser.add_argument('--max-files',
+                        help = 'Stop downloading after this many .torrentz.',
+                        dest = 'max_files',
+                        type = int,
+                        required = False,
+                        default = 0
+                        )
+
+    parser.add_argument('--deadline',
+                        help = 'Stop downloading this long after the start e.g. 3600, 90m or 6h. Cut runs continue with --resume.',
+                        dest = 'deadline',
+                        type = duration,
+                        required = False,
+                        default = 0
+                        )
+
     parser.add_argument('-p', '--page',
                         help='Enter a page number to skip ahead number of pages',
                         dest='page',
@@ -160,10 +626,132 @@ def main():
                         nargs = '?'
                         )
     
+    parser.add_argument('--api-url',
+                        help = 'Base URL of the YTS API. Point it at a mirror or a local mock server.',
+                        dest = 'api_url',
+                        type = str,
+                        required = False,
+                        default = 'https://yts.mx/api/v2/'
+                        )
+    return parser
+
+# Argument parser of yifi merge
+def build_merge_parser():
+    parser = argparse.ArgumentParser(prog = "yifi merge",
+                                     description = "Combines the output folders of yifi --shard runs.")
+    parser.add_argument('sources',
+                        help = 'Output folders of the shards.',
+                        nargs = '+')
+    parser.add_argument('-o', '--output',
+                        help = 'Merged folder. Defaults to the first shard folder.',
+                        dest = 'output',
+                        required = False,
+                        default = None)
+    parser.add_argument('--link',
+                        help = "How files reach the merged folder. Valid arguments are : 'copy', 'hardlink'",
+                        dest = 'link',
+                        type = str.lower,
+                        required = False,
+                        choices = ['copy', 'hardlink'],
+                        default = 'copy')
+    return parser
+
+def merge(argv):
+    args = build_merge_parser().parse_args(argv)
+    from yifi.merge import Merger
+    merger = Merger(args.sources, args.output or args.sources[0], link = args.link).run()
+    print(f"Merged {merger.files} files into {merger.destination} . "
+          f"{merger.duplicates} duplicates dropped, {merger.conflicts} conflicting copies kept from the first shard.")
+    print(f"Index : {merger.torrents} .torrentz , Export : {merger.rows} rows")
+
+# Argument parsers of yifi ls and yifi extract
+def build_ls_parser():
+    parser = argparse.ArgumentParser(prog = "yifi ls",
+                                     description = "Lists the files of a yifi --pack.")
+    parser.add_argument('pack',
+                        help = 'Pack file, e.g. Rating/yifi-pack.db')
+    parser.add_argument('patterns',
+                        help = 'Only paths matching these globs, e.g. "8+/*".',
+                        nargs = '*')
+    return parser
+
+def build_extract_parser():
+    parser = argparse.ArgumentParser(prog = "yifi extract",
+                                     description = "Writes files of a yifi --pack back into the folder layout.")
+    parser.add_argument('pack',
+                        help = 'Pack file, e.g. Rating/yifi-pack.db')
+    parser.add_argument('patterns',
+                        help = 'Only paths matching these globs, e.g. "*1080p.torrent". Default : everything.',
+                        nargs = '*')
+    parser.add_argument('-o', '--output',
+                        help = 'Folder the layout is written into. Defaults to the folder of the pack.',
+                        dest = 'output',
+                        required = False,
+                        default = None)
+    parser.add_argument('--stdout',
+                        help = 'Write the single matching file to stdout instead.',
+                        dest = 'stdout',
+                        action = 'store_true')
+    return parser
+
+def ls(argv):
+    args = build_ls_parser().parse_args(argv)
+    from yifi.pack import PackArchive
+    pack = PackArchive(args.pack, readonly = True)
+    count = total = 0
+    for path, size, added_at in pack.items(args.patterns):
+        print(f"{size:>10}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(added_at))}  {path}")
+        count += 1
+        total += size
+    pack.close()
+    print(f"{count} files , {total} bytes")
+
+def extract(argv):
+    parser = build_extract_parser()
+    args = parser.parse_args(argv)
+    from yifi.pack import PackArchive
+    pack = PackArchive(args.pack, readonly = True)
+    try:
+        if args.stdout:
+            paths = [path for path, size, added_at in pack.items(args.patterns)]
+            if len(paths) != 1:
+                parser.error(f"--stdout needs exactly one matching file, {len(paths)} match")
+            sys.stdout.buffer.write(pack.read(paths[0]))
+            return
+        destination = args.output or os.path.dirname(args.pack) or os.path.curdir
+        written = pack.extract(destination, args.patterns)
+        print(f"Extracted {written} files into {destination}")
+    finally:
+        pack.close()
+
+def main():
+    """YiFi - .torrent database downloader for
+       Web Appplication ( yts.com ) 
+    """
+    
+    commands = {'merge': merge, 'ls': ls, 'extract': extract}
+    if sys.argv[1:2] and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+        exit(0)
+    
+    parser = build_parser()
     try:
         args = parser.parse_args()
+        if (args.since_last_run or args.watch) and args.no_index:
+            parser.error("--since-last-run and --watch keep their watermark in the download index")
+        if args.shard and args.shard_by == 'page' and (args.since_last_run or args.watch):
+            parser.error("--since-last-run and --watch have no fixed page range, use --shard-by movie")
+        if args.pack is not None and args.store:
+            parser.error("--pack keeps its own deduplicated copy of every file, drop --store")
+        if args.resume and args.export == 'parquet':
+            parser.error("--resume appends to the metadata export, parquet files are rewritten. Use --export csv or jsonl")
+        # requests, tqdm and the pipeline are only loaded once the arguments are valid
+        from yifi.scraper import Scraper
         scraper = Scraper(args)
-        scraper.download()
+        if args.relayout:
+            scraper.relayout()
+        else:
+            scraper.download()
         
     except KeyboardInterrupt:
         print("\n Key Interuptions , Exiting with Excitement \n")
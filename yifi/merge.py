@@ -0,0 +1,222 @@
+import os
+import csv
+import glob
+import json
+import shutil
+import filecmp
+import sqlite3
+from yifi.index import DownloadIndex
+from yifi.pack import PackArchive
+from yifi.export import COLUMNS, FORMATS, Exporter
+
+# Run state of a shard, merged through the index and the exports instead of copied
+STATE_FILES = ('yifi-index', 'yifi-state', 'yifi-pack', 'YiFi-Scraper', 'magnets')
+
+
+class Merger:
+    """
+    Merger class - Combines the output folders of `--shard` runs
+
+    Files are merged by their path relative to the shard folder, the
+    first copy of a path wins and identical duplicates are dropped.
+    Shard indexes are folded into one index keyed by infohash with
+    their paths rewritten to the merged folder, exports are
+    concatenated with one row per ( movie, torrent ), magnet lists
+    keep every link once and packs are merged item by item. Shards that wrote into the same folder are
+    merged in place.
+    """
+
+    def __init__(self, sources, destination, link = 'copy'):
+        self.sources = sources
+        self.destination = destination
+        self.link_mode = link
+        self.files = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.torrents = 0
+        self.rows = 0
+
+    def run(self):
+        os.makedirs(self.destination, exist_ok = True)
+        for source in self.sources:
+            self.__merge_files(source)
+        self.__merge_indexes()
+        self.__merge_exports()
+        self.__merge_magnets()
+        self.__merge_packs()
+        return self
+
+    @staticmethod
+    def __is_state(name):
+        return name.startswith(STATE_FILES)
+
+    def __place(self, source, target):
+        if self.link_mode == 'hardlink':
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copy2(source, target)
+
+    def __merge_files(self, source):
+        for root, dirs, files in os.walk(source):
+            relative_root = os.path.relpath(root, source)
+            if relative_root == os.path.curdir:
+                files = [name for name in files if not self.__is_state(name)]
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                target = os.path.normpath(os.path.join(self.destination, relative_root, name))
+                if os.path.exists(target):
+                    if os.path.samefile(path, target) or filecmp.cmp(path, target, shallow = False):
+                        self.duplicates += 1
+                    else:
+                        # Same path, different content : the first shard wins
+                        self.conflicts += 1
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok = True)
+                self.__place(path, target)
+                self.files += 1
+
+    # Files matching pattern in the top folder of every shard
+    def __shard_files(self, pattern):
+        paths = []
+        for source in self.sources:
+            for path in sorted(glob.glob(os.path.join(source, pattern))):
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    def __merge_indexes(self):
+        target_path = os.path.join(self.destination, "yifi-index.db")
+        sources = [path for path in self.__shard_files("yifi-index*.db")
+                   if not os.path.exists(target_path) or not os.path.samefile(path, target_path)]
+        if not sources:
+            return
+        target = DownloadIndex(target_path)
+        target.set_meta('directory', self.destination)
+        try:
+            for path in sources:
+                connection = sqlite3.connect(path)
+                row = connection.execute("SELECT value FROM meta WHERE key = 'directory'").fetchone()
+                # Paths were recorded relative to the shard's own output folder
+                directory = row[0] if row else None
+                for torrent_hash, movie_id, imdb_code, quality, paths, size, fetched_at in \
+                        connection.execute("SELECT * FROM torrents"):
+                    paths = [self.__merged_path(recorded, directory) for recorded in json.loads(paths or '[]')]
+                    existing = target.get(torrent_hash)
+                    if existing is not None:
+                        paths = existing['paths'] + [path for path in paths if path not in existing['paths']]
+                    else:
+                        self.torrents += 1
+                    target.record(movie_id, torrent_hash, quality, paths, size,
+                                  imdb_code = imdb_code, fetched_at = fetched_at)
+                connection.close()
+        finally:
+            target.close()
+
+    def __merged_path(self, recorded, directory):
+        if not directory:
+            return recorded
+        relative = os.path.relpath(recorded, directory)
+        # Every shard's magnet list ends up in one magnets.txt
+        if os.path.dirname(relative) == '' and relative.startswith('magnets'):
+            relative = "magnets.txt"
+        return os.path.join(self.destination, relative)
+
+    # ( movie id, torrent hash ) is unique across the merged export
+    @staticmethod
+    def __row_key(row):
+        return (str(row.get('id')), str(row.get('torrent_hash') or row.get('torrent_url')))
+
+    def __merge_exports(self):
+        for format, extension in FORMATS.items():
+            target_path = os.path.join(self.destination, "YiFi-Scraper" + extension)
+            sources = [path for path in self.__shard_files("YiFi-Scraper*" + extension)
+                       if not os.path.exists(target_path) or not os.path.samefile(path, target_path)]
+            if not sources:
+                continue
+            seen = set()
+            rows = []
+            for path in sources:
+                for row in self.__read_rows(format, path):
+                    key = self.__row_key(row)
+                    if key not in seen:
+                        seen.add(key)
+                        rows.append(row)
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            exporter = Exporter(format, target_path)
+            try:
+                for row in rows:
+                    exporter.write_row(row)
+            finally:
+                exporter.close()
+            self.rows += exporter.rows
+
+    @staticmethod
+    def __read_rows(format, path):
+        if format == 'csv':
+            kinds = dict(COLUMNS)
+            with open(path, newline = '', encoding = 'utf-8') as file:
+                reader = csv.DictReader(file)
+                # CSVs of older versions have other columns, they are left out of the merge
+                if reader.fieldnames != [name for name, kind in COLUMNS]:
+                    return
+                for row in reader:
+                    row = {name: (value if value != '' else None) for name, value in row.items()}
+                    row['genres'] = row['genres'].split("|") if row.get('genres') else []
+                    yield {name: row.get(name) for name in kinds}
+        elif format == 'jsonl':
+            with open(path, encoding = 'utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Merging parquet exports requires pyarrow. Install it with : pip install YiFi[parquet]")
+            yield from pyarrow.parquet.read_table(path).to_pylist()
+
+    def __merge_magnets(self):
+        target_path = os.path.join(self.destination, "magnets.txt")
+        sources = [path for path in self.__shard_files("magnets*.txt")
+                   if not os.path.exists(target_path) or not os.path.samefile(path, target_path)]
+        if not sources:
+            return
+        seen = set()
+        if os.path.exists(target_path):
+            with open(target_path) as magnets:
+                seen.update(line.strip() for line in magnets if line.strip())
+        with open(target_path, "a") as target:
+            for path in sources:
+                with open(path) as magnets:
+                    for line in magnets:
+                        line = line.strip()
+                        if line and line not in seen:
+                            seen.add(line)
+                            target.write(line + "\n")
+
+    # Items are keyed by their layout path like the files, the first shard's copy wins
+    def __merge_packs(self):
+        target_path = os.path.join(self.destination, "yifi-pack.db")
+        sources = [path for path in self.__shard_files("yifi-pack*.db")
+                   if not os.path.exists(target_path) or not os.path.samefile(path, target_path)]
+        if not sources:
+            return
+        target = PackArchive(target_path)
+        try:
+            for path in sources:
+                source = PackArchive(path, readonly = True)
+                for item, size, added_at in source.items():
+                    if item in target:
+                        self.duplicates += 1
+                        continue
+                    target.put(item, source.read(item))
+                    self.files += 1
+                source.close()
+        finally:
+            target.close()
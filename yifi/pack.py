@@ -0,0 +1,108 @@
+import os
+import time
+import fnmatch
+import sqlite3
+import hashlib
+import threading
+from yifi.fsutil import write_atomic
+
+
+class PackArchive:
+    """
+    PackArchive class - Single file container for .torrent files and posters
+
+    `--pack` writes every file the folder layout would have held into
+    one SQLite database instead : the bytes once per sha256 in `blobs`,
+    and every path relative to the output folder in `items`. Category
+    copies of a torrent share a blob, the folder tree costs no inodes,
+    and `yifi ls` / `yifi extract` read single items through the path
+    index or materialise the layout on demand.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            key         TEXT PRIMARY KEY,
+            content     BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            path        TEXT PRIMARY KEY,
+            key         TEXT NOT NULL,
+            size        INTEGER NOT NULL,
+            added_at    REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path, readonly = False):
+        self.path = path
+        if readonly and not os.path.isfile(path):
+            raise FileNotFoundError(f"No pack at {path}")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    # Paths are stored with forward slashes, whatever the platform
+    @staticmethod
+    def __key(path):
+        return path.replace(os.sep, '/')
+
+    def put(self, path, content):
+        key = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?)", (key, sqlite3.Binary(content)))
+                self.connection.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                                        (self.__key(path), key, len(content), time.time()))
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def __contains__(self, path):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM items WHERE path = ?",
+                                           (self.__key(path),)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def paths(self):
+        with self.lock:
+            return [path for (path,) in self.connection.execute("SELECT path FROM items")]
+
+    # ( path, size, added_at ) of the items matching any of the glob patterns, all without patterns
+    def items(self, patterns = None):
+        with self.lock:
+            rows = self.connection.execute("SELECT path, size, added_at FROM items ORDER BY path").fetchall()
+        for row in rows:
+            if not patterns or any(fnmatch.fnmatchcase(row[0], pattern) for pattern in patterns):
+                yield row
+
+    def read(self, path):
+        with self.lock:
+            row = self.connection.execute("SELECT blobs.content FROM items JOIN blobs ON blobs.key = items.key "
+                                          "WHERE items.path = ?", (self.__key(path),)).fetchone()
+        return bytes(row[0]) if row else None
+
+    # Writes the matching items under destination, files already there with the same size are kept
+    def extract(self, destination, patterns = None):
+        written = 0
+        directories = set()
+        for path, size, added_at in self.items(patterns):
+            target = os.path.join(destination, *path.split('/'))
+            if os.path.isfile(target) and os.path.getsize(target) == size:
+                continue
+            directory = os.path.dirname(target)
+            if directory not in directories:
+                os.makedirs(directory, exist_ok = True)
+                directories.add(directory)
+            write_atomic(target, self.read(path))
+            written += 1
+        return written
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
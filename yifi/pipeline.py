@@ -0,0 +1,159 @@
+import os
+import queue
+import threading
+from concurrent.futures.thread import ThreadPoolExecutor
+
+
+class Pipeline:
+    """
+    Pipeline class - Bounded producer/consumer scheduler
+
+    Page fetches run ahead of the downloads into a bounded queue,
+    movies are drained from it by the torrent workers and posters
+    are handed over to their own pool. The first error raised by
+    any stage stops the run and is re-raised from `run`.
+    """
+
+    # Sentinel pushed by every page worker once the page range is exhausted
+    _DONE = object()
+
+    def __init__(self, fetch_page, handle_movie,
+                 page_workers = 1, torrent_workers = 1, poster_workers = 1, queue_size = None):
+        self.fetch_page = fetch_page
+        self.handle_movie = handle_movie
+        self.page_workers = max(1, page_workers)
+        self.torrent_workers = max(1, torrent_workers)
+        self.poster_workers = max(1, poster_workers)
+        # Pages fetched ahead of the torrent workers
+        self.queue_size = max(1, queue_size or self.page_workers * 2)
+
+        self.error = None
+        self.stopped = threading.Event()
+        self.paging_stopped = threading.Event()
+
+        self.__pages = None
+        self.__pages_lock = threading.Lock()
+        self.__queue = None
+        self.__torrent_slots = None
+        self.__poster_slots = None
+        self.__torrent_executor = None
+        self.__poster_executor = None
+
+    # Pull the next page number shared by all page workers
+    def __next_page(self):
+        with self.__pages_lock:
+            if self.paging_stopped.is_set():
+                return None
+            return next(self.__pages, None)
+
+    # Blocking put that gives up once the pipeline is stopped
+    def __put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.__queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __page_worker(self):
+        try:
+            while not self.stopped.is_set():
+                page = self.__next_page()
+                if page is None:
+                    break
+                movies = self.fetch_page(page)
+                self.__put((page, movies or []))
+        except BaseException as error:
+            self.fail(error)
+        finally:
+            self.__put(self._DONE)
+
+    def __run_task(self, slots, fn, args):
+        try:
+            if not self.stopped.is_set():
+                fn(*args)
+        except BaseException as error:
+            self.fail(error)
+        finally:
+            slots.release()
+
+    # Records the first error and stops every stage
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    # Stops handing out new pages, already queued pages are still processed
+    def stop_paging(self):
+        self.paging_stopped.set()
+
+    # Queue a poster job, blocks the caller while the poster pool is saturated
+    def submit_poster(self, fn, *args):
+        self.__poster_slots.acquire()
+        self.__poster_executor.submit(self.__run_task, self.__poster_slots, fn, args)
+
+    def run(self, pages):
+        self.__pages = iter(pages)
+        self.__queue = queue.Queue(maxsize = self.queue_size)
+        # At most one pending task per worker waits behind the running ones
+        self.__torrent_slots = threading.BoundedSemaphore(self.torrent_workers * 2)
+        self.__poster_slots = threading.BoundedSemaphore(self.poster_workers * 2)
+        self.__torrent_executor = ThreadPoolExecutor(max_workers = self.torrent_workers,
+                                                     thread_name_prefix = 'yifi-torrent')
+        self.__poster_executor = ThreadPoolExecutor(max_workers = self.poster_workers,
+                                                    thread_name_prefix = 'yifi-poster')
+
+        page_threads = [threading.Thread(target = self.__page_worker,
+                                         name = f'yifi-page-{i}',
+                                         daemon = True)
+                        for i in range(self.page_workers)]
+        for thread in page_threads:
+            thread.start()
+
+        try:
+            finished = 0
+            while finished < self.page_workers and not self.stopped.is_set():
+                try:
+                    item = self.__queue.get(timeout = 0.1)
+                except queue.Empty:
+                    continue
+
+                if item is self._DONE:
+                    finished += 1
+                    continue
+
+                page, movies = item
+                for movie in movies:
+                    # Backpressure : wait for a free torrent slot
+                    while not self.__torrent_slots.acquire(timeout = 0.1):
+                        if self.stopped.is_set():
+                            break
+                    if self.stopped.is_set():
+                        break
+                    self.__torrent_executor.submit(self.__run_task, self.__torrent_slots,
+                                                   self.handle_movie, (movie,))
+
+            # Torrent workers feed the poster pool, drain them first
+            self.__torrent_executor.shutdown(wait = True)
+            self.__poster_executor.shutdown(wait = True)
+        except BaseException as error:
+            self.fail(error)
+            raise
+        finally:
+            self.stopped.set()
+            self.__torrent_executor.shutdown(wait = False, cancel_futures = True)
+            self.__poster_executor.shutdown(wait = False, cancel_futures = True)
+            for thread in page_threads:
+                thread.join(timeout = 1)
+
+        if self.error is not None:
+            raise self.error
+
+
+# Default worker counts for each stage
+def default_workers(multiprocess):
+    if not multiprocess:
+        return 1, 1, 1
+    # Same sizing ThreadPoolExecutor uses for max_workers = None
+    workers = min(32, (os.cpu_count() or 1) + 4)
+    return 2, workers, max(1, workers // 2)
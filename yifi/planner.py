@@ -0,0 +1,111 @@
+GENRES = ['action', 'adventure', 'animation', 'biography', 'comedy', 'crime', 'documentary',
+          'drama', 'family', 'fantasy', 'film-noir', 'game-show', 'history', 'horror', 'music',
+          'musical', 'mystery', 'news', 'reality-tv', 'romance', 'sci-fi', 'sport', 'talk-show',
+          'thriller', 'war', 'western']
+
+
+# Highest seed count over the torrents of a movie
+def movie_seeds(movie):
+    return max([torrent.get('seeds') or 0 for torrent in movie.get('torrents') or []] or [0])
+
+
+class QueryPlan:
+    """
+    QueryPlan class - Cheapest list_movies.json query for the CLI filters
+
+    Filters the API understands ( one quality, one genre, minimum
+    rating ) are pushed down into the query. For the others the plan
+    picks a sort order that makes one of them monotonic, newest year
+    first for --year-limit or most seeded first for --min-seeds, so
+    paging can stop at the first page whose last movie fails it.
+    Whatever is left ( several genres, languages, seeds per torrent )
+    is checked client side by `movie_reject` and `torrent_reject`.
+    An explicit --sort-by or an incremental crawl keeps its order and
+    only gets the pushdown.
+    """
+
+    def __init__(self, quality = 'all', genres = (), minimum_rating = 0, year_limit = 0,
+                 languages = (), min_seeds = 0, sort_by = None, incremental = False):
+        self.quality = quality
+        self.genres = [genre.lower() for genre in genres if genre.lower() != 'all']
+        self.minimum_rating = int(minimum_rating or 0)
+        self.year_limit = int(year_limit or 0)
+        self.languages = [language.lower() for language in languages]
+        self.min_seeds = int(min_seeds or 0)
+
+        # A single genre is a query parameter, several are matched here
+        self.genre = self.genres[0] if len(self.genres) == 1 else 'all'
+
+        self.cutoff = None
+        if incremental:
+            # The watermark needs newest first
+            self.sort_by, self.order_by = 'date_added', 'desc'
+        elif sort_by is None and self.year_limit:
+            self.sort_by, self.order_by = 'year', 'desc'
+            self.cutoff = 'year'
+        elif sort_by is None and self.min_seeds:
+            # The API orders a movie by the seeds of its best torrent
+            self.sort_by, self.order_by = 'seeds', 'desc'
+            self.cutoff = 'seeds'
+        elif sort_by in (None, 'latest'):
+            self.sort_by, self.order_by = 'date_added', 'desc'
+        else:
+            self.sort_by, self.order_by = sort_by, 'asc'
+
+    # list_movies.json URL of the plan without the page number
+    def url(self, api_url, limit = 50):
+        return "{api_url}list_movies.json?quality={quality}&genre={genre}&minimum_rating={minimum_rating}&sort_by={sort_by}&order_by={order_by}&limit={limit}&page=".format(
+            api_url = api_url.rstrip('/') + '/',
+            quality = self.quality,
+            genre = self.genre,
+            minimum_rating = self.minimum_rating,
+            sort_by = self.sort_by,
+            order_by = self.order_by,
+            limit = limit,
+        )
+
+    # Reason the movie is dropped, None when it matches
+    def movie_reject(self, movie):
+        if (movie.get('year') or 0) < self.year_limit:
+            return 'year'
+        if (movie.get('rating') or 0) < self.minimum_rating:
+            return 'rating'
+        if self.genres and not set(self.genres) & {genre.lower() for genre in movie.get('genres') or []}:
+            return 'genre'
+        if self.languages and (movie.get('language') or '').lower() not in self.languages:
+            return 'language'
+        return None
+
+    def torrent_reject(self, torrent):
+        if not (self.quality == 'all' or self.quality.lower() == (torrent.get('quality') or '').lower()):
+            return 'quality'
+        if (torrent.get('seeds') or 0) < self.min_seeds:
+            return 'seeds'
+        return None
+
+    # Sorted by the cutoff field : once one movie fails it every later one does
+    def past_cutoff(self, movie):
+        if self.cutoff == 'year':
+            return (movie.get('year') or 0) < self.year_limit
+        if self.cutoff == 'seeds':
+            return movie_seeds(movie) < self.min_seeds
+        return False
+
+    def describe(self):
+        pushed = [f"quality={self.quality}", f"genre={self.genre}", f"minimum_rating={self.minimum_rating}",
+                  f"sort_by={self.sort_by}", f"order_by={self.order_by}"]
+        client = []
+        if self.year_limit:
+            client.append(f"year >= {self.year_limit}")
+        if len(self.genres) > 1:
+            client.append("genre in " + ",".join(self.genres))
+        if self.languages:
+            client.append("language in " + ",".join(self.languages))
+        if self.min_seeds:
+            client.append(f"seeds >= {self.min_seeds}")
+        plan = "API : " + " ".join(pushed)
+        if client:
+            plan += " | client : " + " , ".join(client)
+        if self.cutoff:
+            plan += f" | stops at the first page past the {self.cutoff} cutoff"
+        return plan
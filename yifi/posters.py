@@ -0,0 +1,74 @@
+import io
+import os
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# --poster-size -> cover field of the API's movie objects
+POSTER_SIZES = {'small': 'small_cover_image', 'medium': 'medium_cover_image', 'large': 'large_cover_image'}
+POSTER_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+
+def poster_url(movie, size = 'large'):
+    return movie.get(POSTER_SIZES[size]) or movie.get('large_cover_image')
+
+
+# Runs in the worker processes : decode, shrink to width, encode
+def transform(content, width, format, quality):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        if width and image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format = POSTER_FORMATS[format], quality = quality)
+        return output.getvalue()
+
+
+class PosterProcessor:
+    """
+    PosterProcessor class - Resizes and recompresses posters off the download threads
+
+    Decoding and encoding images holds the GIL, so the work is handed to
+    a process pool and the I/O threads ( or the event loop ) only wait
+    on a future. The pool is spawned on the first poster. Without
+    --poster-width or a new format, posters are passed through as
+    fetched and Pillow is never needed.
+    """
+
+    def __init__(self, width = None, format = 'jpg', quality = 80, workers = None):
+        self.width = width
+        self.format = format
+        self.quality = quality
+        self.workers = max(1, min(workers or os.cpu_count() or 1, os.cpu_count() or 1))
+        self.enabled = bool(width) or format != 'jpg'
+        self.extension = "." + format
+        self.executor = None
+        self.lock = threading.Lock()
+        if self.enabled and importlib.util.find_spec('PIL') is None:
+            raise ImportError("Resizing or converting posters requires Pillow. Install it with : pip install YiFi[posters]")
+
+    # Future of the processed poster bytes
+    def submit(self, content):
+        if not self.enabled:
+            future = Future()
+            future.set_result(content)
+            return future
+        with self.lock:
+            if self.executor is None:
+                # Spawned workers, forking a process full of threads is unsafe
+                self.executor = ProcessPoolExecutor(max_workers = self.workers,
+                                                    mp_context = multiprocessing.get_context('spawn'))
+        return self.executor.submit(transform, content, self.width, self.format, self.quality)
+
+    def process(self, content):
+        return self.submit(content).result()
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait = True, cancel_futures = True)
+                self.executor = None
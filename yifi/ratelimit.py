@@ -0,0 +1,119 @@
+import time
+import asyncio
+import threading
+
+
+class HostLimit:
+    """
+    HostLimit class - Token bucket with an AIMD controlled rate and concurrency
+
+    Every success adds roughly one request per second to the rate and one
+    slot to the concurrency per window of successes (additive increase),
+    a throttle signal halves both (multiplicative decrease). Decreases are
+    spaced by `cooldown` so a burst of failures from requests that were
+    already in flight only counts once.
+    """
+
+    def __init__(self, rate, max_rate, max_concurrency,
+                 min_rate = 0.5, decrease = 0.5, cooldown = 1.0):
+        self.max_rate = max(min_rate, max_rate)
+        self.min_rate = min_rate
+        self.rate = min(max(min_rate, rate), self.max_rate)
+        self.max_concurrency = max(1, max_concurrency)
+        # Slow start from a quarter of the ceiling
+        self.concurrency = max(1.0, self.max_concurrency / 4)
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.last_refill = time.monotonic()
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    # Seconds to wait before a request may start, 0 once a token and a slot are taken
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            # Bucket holds at most one second worth of tokens
+            self.tokens = min(max(1.0, self.rate),
+                              self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+
+            if self.in_flight >= int(self.concurrency):
+                return 0.01
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    # Additive increase
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    # Multiplicative decrease
+    def throttle(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.concurrency = max(1.0, self.concurrency * self.decrease)
+
+
+class RateLimiter:
+    """
+    RateLimiter class - Separate adaptive limits for the API and the file hosts
+
+    list_movies.json requests are limited as 'api', torrents and posters
+    as 'files', even when both are served from the same host.
+    """
+
+    # Status codes the server uses to tell us to slow down
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, api_rate = 2, rate = 10, max_rate = 50,
+                 api_concurrency = 2, concurrency = 10):
+        self.limits = {'api': HostLimit(api_rate, max(api_rate, max_rate / 5), api_concurrency),
+                       'files': HostLimit(rate, max(rate, max_rate), concurrency)}
+
+    @staticmethod
+    def group(url):
+        return 'api' if '/api/' in url else 'files'
+
+    def acquire(self, url):
+        limit = self.limits[self.group(url)]
+        while True:
+            wait = limit.try_acquire()
+            if not wait:
+                return limit
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        limit = self.limits[self.group(url)]
+        while True:
+            wait = limit.try_acquire()
+            if not wait:
+                return limit
+            await asyncio.sleep(wait)
+
+    # Feeds a response status ( None for timeouts / connection errors ) back into the limit
+    def feedback(self, limit, status):
+        limit.release()
+        if status is None or status in self.THROTTLE_STATUSES:
+            limit.throttle()
+        else:
+            limit.success()
+
+    # Short summary for the progress bar
+    def describe(self):
+        return " | ".join(f"{name} {limit.rate:.1f}/s x{int(limit.concurrency)}"
+                          for name, limit in self.limits.items())
@@ -0,0 +1,120 @@
+import time
+import heapq
+import threading
+
+# Fields of the API's movie and torrent objects a run can be ordered by
+PRIORITY_KEYS = ['seeds', 'peers', 'download_count', 'rating', 'size']
+
+
+# Priority value of one torrent, movie level keys are shared by its torrents
+def torrent_priority(movie, torrent, key):
+    if key == 'size':
+        return torrent.get('size_bytes') or 0
+    if key in ('seeds', 'peers'):
+        return torrent.get(key) or 0
+    return movie.get(key) or 0
+
+
+class Budget:
+    """
+    Budget class - Limits of a run on files, bytes and time
+
+    `take` reserves one torrent before it is fetched, so --max-files is
+    exact across workers. Bytes are counted as the bodies arrive, each
+    worker can overshoot --max-bytes by the download it has in flight.
+    The deadline counts from the start of the run. `cut` is the number
+    of torrents refused, a cut run is not complete.
+    """
+
+    def __init__(self, max_bytes = 0, max_files = 0, deadline = 0):
+        self.max_bytes = max_bytes or 0
+        self.max_files = max_files or 0
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.bytes = 0
+        self.files = 0
+        self.cut = 0
+        self.lock = threading.Lock()
+
+    # Name of the first exhausted limit, None while every limit has room
+    def exhausted(self):
+        if self.max_files and self.files >= self.max_files:
+            return 'file'
+        if self.max_bytes and self.bytes >= self.max_bytes:
+            return 'byte'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'time'
+        return None
+
+    def take(self):
+        with self.lock:
+            reason = self.exhausted()
+            if reason is None:
+                self.files += 1
+            else:
+                self.cut += 1
+            return reason
+
+    # A reserved torrent that couldn't be fetched
+    def release(self):
+        with self.lock:
+            self.files -= 1
+
+    def spend(self, size):
+        with self.lock:
+            self.bytes += size
+
+
+class Scheduler:
+    """
+    Scheduler class - Priority queue of the discovered torrents
+
+    Every selected torrent of the crawl is pushed with its priority,
+    iterating pops them highest first ( lowest with ascending ) and
+    equal priorities keep their discovery order. A movie is done once
+    its last torrent is, `done` hands back the paths written for it.
+    """
+
+    def __init__(self, key, descending = True):
+        self.key = key
+        self.descending = descending
+        self.heap = []
+        self.sequence = 0
+        # movie id -> [ torrents left, written paths, failed ]
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    # False when the movie is queued already, catalog shifts repeat movies across pages
+    def push(self, movie, movie_name, selected):
+        with self.lock:
+            if movie.get('id') in self.pending:
+                return False
+            self.pending[movie.get('id')] = [len(selected), [], False]
+            for torrent, genres in selected:
+                priority = torrent_priority(movie, torrent, self.key)
+                heapq.heappush(self.heap, (-priority if self.descending else priority, self.sequence,
+                                           (movie, movie_name, torrent, genres)))
+                self.sequence += 1
+            return True
+
+    def __iter__(self):
+        while True:
+            with self.lock:
+                if not self.heap:
+                    return
+                job = heapq.heappop(self.heap)[2]
+            yield job
+
+    # ( written paths, failed ) once the movie's last torrent is done, None before
+    def done(self, movie, paths, failed):
+        with self.lock:
+            entry = self.pending[movie.get('id')]
+            entry[0] -= 1
+            entry[1] += paths
+            entry[2] = entry[2] or failed
+            if entry[0] > 0:
+                return None
+            del self.pending[movie.get('id')]
+            return entry[1], entry[2]
+
+    def __len__(self):
+        return len(self.heap)
@@ -2,11 +2,28 @@ import os
 import sys
 import math
 import json
-import csv
+import time
+import itertools
+import threading
 import requests
 from tqdm import tqdm
-from fake_useragent import UserAgent
-from concurrent.futures.thread import ThreadPoolExecutor
+from yifi.pipeline import Pipeline, default_workers
+from yifi.transport import Transport
+from yifi.ratelimit import RateLimiter
+from yifi.index import DownloadIndex
+from yifi.magnet import magnet_uri
+from yifi.export import Exporter, FORMATS
+from yifi.cache import ResponseCache
+from yifi.blobstore import BlobStore
+from yifi.stats import Stats, load_hook
+from yifi.checkpoint import Checkpoint
+from yifi.fsutil import write_atomic
+from yifi.planner import QueryPlan
+from yifi.tree import OutputTree
+from yifi.scheduler import Budget, Scheduler
+from yifi.useragent import UserAgentPool
+from yifi.posters import PosterProcessor, poster_url
+from yifi.pack import PackArchive
 
 
 class Scraper:
@@ -17,7 +34,7 @@ class Scraper:
     # Constructor
     def __init__(self, args):
         self.output = args.output
-        self.genre = args.genre
+        self.genres = args.genre
         self.minimum_rating = args.rating
         self.quality = '3d' if (args.quality == '3d') else args.quality
         self.categorize = args.categorize_by
@@ -25,16 +42,105 @@ class Scraper:
         self.year_limit = args.year_limit
         self.page_arg = args.page
         self.poster = args.background
+        # Cover size fetched for -b, resized and recompressed in worker processes
+        self.poster_size = args.poster_size
+        self.posters = PosterProcessor(width = args.poster_width,
+                                       format = args.poster_format,
+                                       quality = args.poster_quality,
+                                       workers = args.poster_processes)
         self.imdb_id = args.imdb_id
         self.multiprocess = args.multiprocess
         self.csv_only = args.csv_only
+        self.index_path = args.index
+        self.use_index = not args.no_index
+        # Finished pages and movies, --resume continues a crashed crawl from them
+        self.state_path = args.state
+        self.resume = args.resume
+        self.api_url = args.api_url.rstrip('/') + '/'
+        self.magnet = args.magnet
+        # --shard i/n : this process only takes its share of the pages or movie ids
+        self.shard = args.shard
+        self.shard_by = args.shard_by
+        # Content-addressed store, category folders only hold links into it
+        self.store = BlobStore(args.store, link = args.link) if args.store else None
+        # --pack writes the folder layout into one SQLite file, yifi extract materialises it
+        self.pack_path = args.pack
+        self.pack = None
+        # Metadata export, --csv--only exports without touching torrent or image endpoints
+        self.export_format = args.export
+        self.export_path = args.export_path
+        # --watch polls with the incremental crawl
+        self.watch = args.watch
+        self.since_last_run = args.since_last_run or bool(self.watch)
+        
+        # Concurrency of each pipeline stage, -m only changes the defaults
+        page_workers, torrent_workers, poster_workers = default_workers(self.multiprocess)
+        self.page_workers = args.page_workers or page_workers
+        self.torrent_workers = args.torrent_workers or torrent_workers
+        self.poster_workers = args.poster_workers or poster_workers
+        self.queue_size = args.queue_size
+        self.engine = args.engine
+        self.concurrency = args.concurrency
+        self.per_host = args.per_host
+        # --priority downloads the whole crawl's torrents by value instead of page order,
+        # the budgets end the run once files, bytes or time run out
+        self.priority = args.priority
+        self.budget = Budget(max_bytes = args.max_bytes, max_files = args.max_files, deadline = args.deadline)
+        self.scheduler = None
+        
+        # Phase timers, counters and per host latencies, --stats prints them at exit
+        self.stats = Stats(hooks = [load_hook(spec) for spec in args.stats_hook or []])
+        self.stats_format = args.stats
+        self.stats_interval = args.stats_interval
+        
+        # Adaptive limits, the worker counts ( or async concurrency ) are the ceilings
+        if self.engine == 'async':
+            api_concurrency, concurrency = self.page_workers, self.concurrency
+        else:
+            api_concurrency, concurrency = self.page_workers, self.torrent_workers + self.poster_workers
+        self.limiter = RateLimiter(api_rate = args.api_rate,
+                                   rate = args.rate,
+                                   max_rate = args.max_rate,
+                                   api_concurrency = api_concurrency,
+                                   concurrency = concurrency)
+        
+        # On-disk response cache, --offline replays from it only
+        cache = None
+        if args.cache or args.offline:
+            cache = ResponseCache(os.path.expanduser(args.cache or os.path.join("~", ".cache", "yifi")),
+                                  ttl = args.cache_ttl,
+                                  max_bytes = args.cache_size * 1024 * 1024)
+        
+        # Shared session for every request, pool sized to the worker count
+        self.transport = Transport(pool_size = self.page_workers + self.torrent_workers + self.poster_workers,
+                                   per_host = self.per_host,
+                                   retries = args.retries,
+                                   backoff = args.backoff,
+                                   limiter = self.limiter,
+                                   cache = cache,
+                                   offline = args.offline,
+                                   stats = self.stats)
         
         self.movie_count = None
         self.url = None
         self.existing_file_counter = None
         self.skip_exit_condition = None
         self.downloaded_movie_ids = None
+        self.index = None
+        self.index_skipped = 0
+        self.checkpoint = None
+        # Newest date_uploaded_unix seen by earlier runs and by this one
+        self.watermark = None
+        self.newest_added = None
+        self.paging_done = False
+        self.magnet_list = None
+        self.exporter = None
+        self.first_page = None
         self.progress_bar = None
+        self.pipeline = None
+        self.user_agents = UserAgentPool()
+        # Guards counters, id list, CSV and progress bar shared by the workers
+        self.lock = threading.Lock()
         
         # Output Directory
         if args.output:
@@ -45,43 +151,54 @@ class Scraper:
             if not args.csv_only:
                 os.makedirs(self.categorize.title(), exist_ok = True)
             self.directory = os.path.join(os.path.curdir, self.categorize.title())
+        # Folders and files of the output tree, scanned once before the first write
+        self.tree = OutputTree(self.directory)
             
-        # Keys to Download .torrents in reverse chronological orderorder_order_globs
-        if args.sort_by == 'latest':
-            self.sort_by = 'date_added'
-            self.order_by = 'desc'
-        else:
-            self.order_by = 'asc'
+        # Filters are pushed into the API query where it can take them, the sort
+        # order is picked so paging can stop early on the rest
+        self.plan = QueryPlan(quality = self.quality,
+                              genres = self.genres,
+                              minimum_rating = self.minimum_rating,
+                              year_limit = self.year_limit,
+                              languages = args.language or [],
+                              min_seeds = args.min_seeds,
+                              sort_by = args.sort_by,
+                              incremental = self.since_last_run)
+        self.sort_by = self.plan.sort_by
+        self.order_by = self.plan.order_by
+        
+        # Incremental crawl walks newest first and stops at the watermark,
+        # a single page worker keeps it from fetching past the cutoff
+        if self.since_last_run:
+            self.page_workers = 1
+        
+        # Shards keep their run state next to their files for `yifi merge`
+        if self.export_path is None:
+            if self.shard:
+                self.export_path = os.path.join(self.directory, "YiFi-Scraper" + self.__shard_suffix() + FORMATS[self.export_format])
+            else:
+                self.export_path = os.path.join(os.path.curdir, "YiFi-Scraper" + FORMATS[self.export_format])
         
         # yts API - Max get requests 50
         self.limit = 50
     
+    # list_movies.json URL without the page number
+    def _api_url(self):
+        return self.plan.url(self.api_url, self.limit)
+    
+    # Fake User Agent Header, rotated through a pool built once and cached on disk
+    def _headers(self):
+        return self.user_agents.headers()
+    
     # Connect to API & extract initial data
     def __get_api_data(self):
-        # Format URL
-        url = """https://yts.mx/api/v2/list_movies.json?quality={quality}&genre={genre}&minimum_rating={minimum_rating}&sort_by={sort_by}&order_by={order_by}&limit={limit}&page=""".format(
-                 quality = self.quality,
-                 genre = self.genre,
-                 minimum_rating = self.minimum_rating,
-                 sort_by = self.sort_by,
-                 order_by = self.order_by,
-                 limit = self.limit,          
-            )
-    
-        # Fake User Agent Header ( Random )
-        try:
-            user_agent = UserAgent()
-            headers = {'User-Agent' : user_agent.random}
-        except:
-            print("Error occured during Fake User Agent Generation.")
+        url = self._api_url()
+        headers = self._headers()
 
         # Connection Errors
         try:
-            req = requests.get(url,
-                               timeout = 5,
-                               verify = True,
-                               headers = headers)
-            req.raise_for_status()
+            with self.stats.timer('page_fetch'):
+                req = self.transport.get(self._initial_url(), headers = headers)
         except requests.exceptions.HTTPError as errh:
             print('HTTP Error : ', errh)
             sys.exit(0)
@@ -97,11 +214,25 @@ class Scraper:
 
         # Exception For JSON Handling
         try:
-            data = req.json()
+            with self.stats.timer('json_decode'):
+                data = req.json()
         except json.decoder.JSONDecodeError:
             print("Could not decode JSON")
 
-        # Adjust Movie Count accordingly to starting page number
+        self._read_api_data(data, url)
+    
+    # Page shards after the first only need movie_count from the initial request,
+    # they ask for one movie instead of a page from another shard's block
+    def __count_probe(self):
+        return bool(self.shard) and self.shard_by == 'page' and self.shard[0] > 1
+    
+    def _initial_url(self):
+        if self.__count_probe():
+            return self.plan.url(self.api_url, 1) + str(self.page_arg)
+        return self._api_url() + str(self.page_arg)
+    
+    # Adjust Movie Count accordingly to starting page number
+    def _read_api_data(self, data, url):
         if self.page_arg == 1:
             movie_count = data.get('data').get('movie_count')
         else:
@@ -109,30 +240,109 @@ class Scraper:
 
         self.movie_count = movie_count
         self.url = url
+        # Reused as the first page of the crawl instead of fetching it twice
+        self.first_page = None if self.__count_probe() else data
     
-    def __initialize_download(self):
+    # File name suffix of this shard's index, checkpoint, export and magnet list
+    def __shard_suffix(self):
+        if not self.shard:
+            return ""
+        return ".shard-{}-of-{}".format(*self.shard)
+    
+    # Response of the initial request when it is the page asked for
+    def _cached_page(self, page):
+        with self.lock:
+            if page != self.page_arg or self.first_page is None:
+                return None
+            page_response, self.first_page = self.first_page, None
+            return page_response
+    
+    # Resets the run state, prints the keys and returns the page range
+    def _prepare_download(self):
         # Used for exit/continue prompt that's triggered after 10 existing files
         self.existing_file_counter = 0
         self.skip_exit_condition = False
         
         # YTS Dupes
         # More > 1x
-        # IDs are stored in this array
+        # IDs are stored in this set
         # To Check File is downloaded before
-        self.downloaded_movie_ids = []
-        # Calc Page Count !x = 1 to except range(1, 1)
-        if math.trunc(self.movie_count / self.limit) + 1 == 1:
-            page_count = 2
+        self.downloaded_movie_ids = set()
+        
+        # Every selected torrent becomes one row of the metadata export
+        if self.exporter is None:
+            os.makedirs(os.path.dirname(self.export_path) or os.path.curdir, exist_ok = True)
+            self.exporter = Exporter(self.export_format, self.export_path)
+        
+        # Single magnet list shared by every movie
+        if self.magnet == 'list' and not self.csv_only and self.magnet_list is None:
+            self.magnet_list = open(os.path.join(self.directory, "magnets" + self.__shard_suffix() + ".txt"), "a")
+        
+        # Torrents recorded by earlier runs are skipped before any request
+        self.index_skipped = 0
+        if self.use_index and (not self.csv_only or self.since_last_run) and self.index is None:
+            index_path = self.index_path or os.path.join(self.directory, "yifi-index" + self.__shard_suffix() + ".db")
+            os.makedirs(os.path.dirname(index_path) or os.path.curdir, exist_ok = True)
+            self.index = DownloadIndex(index_path)
+            # Recorded paths start with it, `yifi merge` rebases them on the merged folder
+            self.index.set_meta('directory', self.directory)
+        
+        self.paging_done = False
+        self.newest_added = None
+        self.watermark = None
+        if self.since_last_run and self.index is not None:
+            watermark = self.index.get_meta(self.__watermark_key())
+            # A 0 left by a run that saw no timestamps is no watermark
+            self.watermark = int(watermark or 0) or None
+        
+        if self.watermark is not None:
+            # Pages until the first movie older than the watermark
+            range_ = itertools.count(int(self.page_arg))
         else:
-            page_count = math.trunc(self.movie_count / self.limit) + 1
-
-        range_ =  range(int(self.page_arg), page_count)
+            # ceil(movie_count / 50) pages from the starting page, the last one may be partial
+            page_count = max(1, math.ceil(self.movie_count / self.limit))
+            range_ =  range(int(self.page_arg), int(self.page_arg) + page_count)
+            if self.shard and self.shard_by == 'page':
+                # Contiguous block of the page range, blocks differ by one page at most
+                shard, shards = self.shard
+                range_ = range_[(shard - 1) * page_count // shards: shard * page_count // shards]
+        
+        # One walk of the output folder, existence checks are lookups after it
+        if not self.csv_only:
+            self.tree.scan()
+            if self.pack_path is not None and self.pack is None:
+                self.pack = PackArchive(self.pack_path or os.path.join(self.directory, "yifi-pack" + self.__shard_suffix() + ".db"))
+                # Packed items count as written files of the layout
+                for path in self.pack.paths():
+                    self.tree.add(os.path.join(self.directory, *path.split('/')))
+        
+        # Torrents are queued while paging and downloaded once every page is known
+        if self.priority and not self.csv_only:
+            key, order = self.priority
+            self.scheduler = Scheduler(key, descending = order == 'desc')
+        
+        # Every page and movie is checkpointed as it completes
+        if self.checkpoint is None:
+            if self.csv_only:
+                # Metadata only runs never create the output folder
+                default_path = os.path.splitext(self.export_path)[0] + "-state.db"
+            else:
+                default_path = os.path.join(self.directory, "yifi-state" + self.__shard_suffix() + ".db")
+            state_path = self.state_path or default_path
+            os.makedirs(os.path.dirname(state_path) or os.path.curdir, exist_ok = True)
+            self.checkpoint = Checkpoint(state_path)
+        resumed = self.checkpoint.begin(self.__checkpoint_key(), resume = self.resume)
+        if resumed:
+            done_pages = self.checkpoint.pages
+            range_ = (page for page in range_ if page not in done_pages)
+            if self.checkpoint.newest_added is not None:
+                self.newest_added = self.checkpoint.newest_added
         
         print("Initializing download with these Keys : \n")
         print("")
         print(f"""Folder: {self.directory}
                  Quality: {self.quality}
-                 Genre: {self.genre} 
+                 Genre: {",".join(self.genres) or 'all'} 
                  Min Rating: {self.minimum_rating}
                  Categorization: {self.categorize}
                  Page: {self.page_arg}
@@ -144,110 +354,441 @@ class Scraper:
         if self.movie_count <= 0:
             print("Could not find any movies with given Keywords")
             sys.exit(0)
+        elif self.watermark is not None:
+            print(".torrentz automation successful .")
+            print(f"Checking for movies added since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.watermark))} ...")
         else:
             print(".torrentz automation successful .")
             print(f"Found {self.movie_count} movies. Starting Download ...")
+        print(f"Query plan : {self.plan.describe()}")
+        if self.shard:
+            print("Shard {} of {} , split by {}.".format(*self.shard, self.shard_by))
+        if self.scheduler is not None:
+            print("Priority : every page is read first, then the .torrentz go out by {} {}.".format(*self.priority))
+        if resumed:
+            print(f"Resuming : {len(self.checkpoint.pages)} pages and {len(self.checkpoint.movies)} movies already done.")
+        elif self.resume:
+            print("Nothing to resume for these keys, starting a new crawl.")
             
         # Progress background
-        self.progress_bar = tqdm(total = self.movie_count, 
+        self.progress_bar = tqdm(total = None if self.watermark is not None else self.movie_count, 
                                  position = 0,
                                  leave = True,
                                  desc = "Downloading",
                                  unit = 'Files')
+        return range_
+    
+    def __initialize_download(self):
+        range_ = self._prepare_download()
+        
+        # Page fetches run ahead of the torrent and poster workers
+        self.pipeline = Pipeline(self.__fetch_page,
+                                 self.__filter_torrents,
+                                 page_workers = self.page_workers,
+                                 torrent_workers = self.torrent_workers,
+                                 poster_workers = self.poster_workers,
+                                 queue_size = self.queue_size)
+        try:
+            self.pipeline.run(range_)
+            if self.scheduler is not None:
+                # Second pass over the queued torrents, the "pages" are single jobs
+                # popped from the heap in priority order
+                self.pipeline = Pipeline(lambda job: [job],
+                                         self.__run_job,
+                                         page_workers = 1,
+                                         torrent_workers = self.torrent_workers,
+                                         poster_workers = self.poster_workers,
+                                         queue_size = self.queue_size)
+                self.pipeline.run(self.scheduler)
+            # Torrents cut by a budget are left for the next run
+            if not self.budget.cut:
+                self._complete_run()
+        finally:
+            self._finish_download()
+        print("Download Finished")
+    
+    # Watermarks are kept per query, other filters may not have seen the same movies
+    def __watermark_key(self):
+        return f"date_added:{self.quality}:{','.join(self.genres) or 'all'}:{self.minimum_rating}"
+    
+    # The checkpoint is only resumed for the same query
+    def __checkpoint_key(self):
+        return f"{self.url}|{self.plan.describe()}|{self.categorize}|{self.magnet}|{self.csv_only}|{self.watermark}|{self.shard}|{self.shard_by}"
+    
+    # Only advanced once a run completes, a crashed run is resumed or crawled again
+    def _complete_run(self):
+        if self.checkpoint is not None:
+            self.checkpoint.complete()
+        # No movie carried a timestamp, a watermark of 0 would hide nothing but says nothing either
+        if not self.since_last_run or self.index is None or not self.newest_added:
+            return
+        if self.watermark is None or self.newest_added > self.watermark:
+            self.index.set_meta(self.__watermark_key(), self.newest_added)
+    
+    # Closes the run state shared by both engines
+    def _finish_download(self):
+        self.progress_bar.close()
+        if self.exporter is not None:
+            print(f"Exported {self.exporter.rows} rows to {self.exporter.path}")
+            self.exporter.close()
+            self.exporter = None
+        if self.magnet_list is not None:
+            self.magnet_list.close()
+            self.magnet_list = None
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
+        if self.pack is not None:
+            print(f"Packed {len(self.pack)} files into {self.pack.path}")
+            self.pack.close()
+            self.pack = None
+        if self.index is not None:
+            if self.index_skipped:
+                print(f"Skipped {self.index_skipped} .torrentz already in the download index.")
+            self.index.close()
+            self.index = None
         
-        # MultiProcess Executor
-        # max_workers to None = Executor Utilize CPU * 5 @
-        executor = ThreadPoolExecutor(max_workers = None)
-        for page in range_:
+    # Fetch a single list_movies.json page
+    def __fetch_page(self, page):
+        page_response = self._cached_page(page)
+        if page_response is None:
             url = "{}{}".format(self.url, str(page))
-            # Generate Random User Fake User Agent
-            try:
-                user_agent = UserAgent()
-                headers = {'User_Agent': user_agent.random}
-            except:
-                print("Error Occured During Fake user Gen.")
-                
             # API request
-            page_response = requests.get(url, 
-                                         timeout = 5, 
-                                         verify = True, 
-                                         headers = headers).json()
-            
-            movies = page_response.get('data').get('movies')
-            
-            # print(movies)
-            # Movies on Current Page
-            if not movies:
-                print("Could not find any .torrentz on this page.\n")
-            
-            if self.multiprocess:
-                #  wrap tqdm arounD executor to update progress_bar with every MultiProcess
-                tqdm(executor.map(self.__filter_torrents, movies), 
-                     total = self.movie_count,
-                     position = 0,
-                     leave = True)
-                
-            else:
-                for movie in movies:
-                    self.__filter_torrents(movie)
-            
-        self.progress_bar.close()
-        print("Download Finished")
+            with self.stats.timer('page_fetch'):
+                response = self.transport.get(url, headers = self._headers())
+            with self.stats.timer('json_decode'):
+                page_response = response.json()
+        movies = self._start_page(page, self._page_movies(page_response))
+        if self.paging_done:
+            self.pipeline.stop_paging()
+        return movies
+    
+    # Movies on Current Page
+    def _page_movies(self, page_response):
+        movies = page_response.get('data').get('movies')
+        if not movies:
+            # Past the last page of an open ended crawl
+            if self.watermark is not None:
+                self.paging_done = True
+            tqdm.write("Could not find any .torrentz on this page.\n")
+            return movies
+        
+        if self.since_last_run:
+            added = [movie.get('date_uploaded_unix') or 0 for movie in movies]
+            with self.lock:
+                self.newest_added = max([self.newest_added or 0] + added)
+        
+        if self.watermark is not None:
+            # Sorted by date_added desc : one old movie means every later page is old
+            new_movies = [movie for movie in movies if (movie.get('date_uploaded_unix') or 0) > self.watermark]
+            if len(new_movies) < len(movies):
+                self.paging_done = True
+            movies = new_movies
         
+        # Sorted by the planner's cutoff field, later pages can't match either
+        if movies and self.plan.past_cutoff(movies[-1]):
+            self.paging_done = True
+        
+        if self.shard and self.shard_by == 'movie':
+            # Every shard reads every page and keeps its own movie ids
+            shard, shards = self.shard
+            movies = [movie for movie in movies if int(movie.get('id')) % shards == shard - 1]
+        return movies
+        
+    
+    # Registers a fetched page with the checkpoint, drops the movies a resumed run finished
+    def _start_page(self, page, movies):
+        if self.checkpoint is None:
+            return movies or []
+        return self.checkpoint.start_page(page, movies, self.newest_added)
+    
+    # Every stage is done with the movie
+    def _finish_movie(self, movie):
+        if self.checkpoint is not None:
+            if self.exporter is not None:
+                self.exporter.sync()
+            self.checkpoint.finish_movie(movie.get('id'))
     
     # .torrent file selector for downloading
-    def __filter_torrents(self, movie):
+    # Returns the movie name and (torrent, genres) of every selected torrent, None when skipped
+    def _select_torrents(self, movie):
         movie_id = str(movie.get('id'))
-        movie_rating = movie.get('rating')
         movie_genres = movie.get('genres') if movie.get('genres') else ['None']
-        movie_name_short = movie.get('title')
-        imdb_id = movie.get('imdb_code')
-        year = movie.get('year')
-        language = movie.get('language')
-        yts_url = movie.get('url')
         
-        if year < self.year_limit:
-            return
+        # Filters the API query couldn't take
+        reason = self.plan.movie_reject(movie)
+        if reason is not None:
+            self.stats.skip(reason)
+            return None
         
         # .torrent option for current movie 
         torrents = movie.get('torrents')
-        # reformat names
-        movie_name = movie.get('title_long').translate({ord(i): None for i in "'/\:*?<>|"})
-        # Multi Folder Categorization
+        movie_name = self.__movie_name(movie)
         
-        is_download_successful = False
-        if movie_id in self.downloaded_movie_ids:
-            return
+        with self.lock:
+            if movie_id in self.downloaded_movie_ids:
+                self.stats.skip('duplicate')
+                return None
+            # Nothing is written in metadata only mode, dupes are caught here
+            if self.csv_only:
+                self.downloaded_movie_ids.add(movie_id)
         
         # 0 .torrentz available        
         if torrents is None:
-            tqdm.write(f"Could not find any torrents for {self.movie_name}. Skipping ...")
-            return
-        
-        bin_content_img = (requests.get(movie.get('large_cover_image'))).content if self.poster else None
+            tqdm.write(f"Could not find any torrents for {movie_name}. Skipping ...")
+            self.stats.skip('no_torrents')
+            return None
         
+        selected = []
         # Iterate through available torrent files
         for torrent in torrents:
             quality = torrent.get('quality')
-            torrent_url = torrent.get('url')
-            if self.categorize and self.categorize != 'rating':
-                if self.quality == 'all' or self.quality == quality:
-                    bin_content_tor = (requests.get(torrent.get('url'))).content
-                    
-                    for genre in movie_genres:
-                        path = self.__build_path(movie_name, movie_rating, quality, genre, imdb_id)
-                        is_download_successful = self.__download_file(bin_content_tor, bin_content_img, path, movie_name, movie_id)   
-            else:
-                if self.quality == 'all' or self.quality == quality:
-                    self.__log_csv(movie_id, imdb_id, movie_name_short, year, language, movie_rating, quality, yts_url, torrent_url)
-                    bin_content_tor = (requests.get(torrent_url)).content
-                    path = self.__build_path(movie_name, movie_rating, quality, None, imdb_id)          
-                    is_download_successful = self.__download_file(bin_content_tor, bin_content_img, path, movie_name, movie_id)
-
-            if is_download_successful and self.quality == 'all' or self.quality == quality:
-                tqdm.write("Downloaded {} {}".format(movie_name, quality.upper()))
+            reason = self.plan.torrent_reject(torrent)
+            if reason is not None:
+                self.stats.skip(reason)
+                continue
+            if self.magnet and not torrent.get('hash'):
+                tqdm.write(f"No infohash for {movie_name} {quality}. Skipping ...")
+                self.stats.skip('no_hash')
+                continue
+            # Multi Folder Categorization
+            genres = self.__layout_genres(movie_genres)
+            if not self.csv_only and self.__indexed(movie, movie_name, torrent, genres):
+                with self.lock:
+                    self.index_skipped += 1
+                self.stats.skip('index')
+                continue
+            # Metadata only : nothing is kept, the row is all there is
+            if self.csv_only:
+                self.__export(movie, movie_name, torrent)
+            selected.append((torrent, genres))
+        return movie_name, selected
+    
+    # Indexed with every path this run's layout gives it, and those are still on disk.
+    # A .magnet doesn't stand in for a .torrent, nor a rating folder for a genre folder
+    def __indexed(self, movie, movie_name, torrent, genres):
+        if self.index is None or torrent.get('hash') not in self.index:
+            return False
+        entry = self.index.get(torrent.get('hash'))
+        extension = self.__output_extension()
+        if self.magnet == 'list':
+            return any(os.path.splitext(path)[1] == extension for path in entry['paths'])
+        recorded = {os.path.normpath(path) for path in entry['paths']}
+        for genre in genres:
+            path = self.__build_path(movie_name, movie.get('rating'), torrent.get('quality'), genre, movie.get('imdb_code')) + extension
+            if os.path.normpath(path) not in recorded or not self.tree.exists(path):
+                return False
+        return True
+    
+    # Extension of the files a kept torrent leaves, magnets.txt in list mode
+    def __output_extension(self):
+        if not self.magnet:
+            return ".torrent"
+        return ".txt" if self.magnet == 'list' else ".magnet"
+    
+    # Genre folders a torrent is copied into, [None] for layouts without one
+    def __layout_genres(self, movie_genres):
+        if self.categorize in ('genre', 'rating-genre', 'genre-rating'):
+            return movie_genres
+        return [None]
+    
+    # reformat names
+    def __movie_name(self, movie):
+        return movie.get('title_long').translate({ord(i): None for i in "'/\:*?<>|"})
+    
+    # Writes a fetched .torrent under every category folder, returns the written paths
+    def _save_torrent(self, movie, movie_name, torrent, genres, bin_content_tor):
+        blob = None
+        if self.store is not None:
+            with self.stats.timer('write'):
+                blob = self.store.put_torrent(movie, torrent, bin_content_tor)
+        written_paths = self.__write_copies(movie, movie_name, torrent, genres, bin_content_tor, ".torrent", blob)
+        self.__kept(movie, movie_name, torrent,
+                    [path + ".torrent" for path in written_paths],
+                    len(bin_content_tor))
+        return written_paths
+    
+    # Every copy of the .torrent is on disk already : skipped before it is fetched
+    def _existing_copies(self, movie, movie_name, torrent, genres):
+        for genre in genres:
+            path = self.__build_path(movie_name, movie.get('rating'), torrent.get('quality'), genre, movie.get('imdb_code'))
+            if not self.tree.exists(path + ".torrent"):
+                return False
+        self.__skip_existing(movie_name)
+        return True
+    
+    # Magnet mode : the link is built from the infohash, nothing is fetched
+    def _save_magnet(self, movie, movie_name, torrent, genres):
+        uri = self.__magnet(movie_name, torrent)
+        if self.magnet == 'list':
+            if self.csv_only:
+                return []
+            with self.lock, self.stats.timer('write'):
+                self.magnet_list.write(uri + "\n")
+            self.__kept(movie, movie_name, torrent, [self.magnet_list.name], 0)
+            return []
+        
+        written_paths = self.__write_copies(movie, movie_name, torrent, genres, (uri + "\n").encode(), ".magnet")
+        self.__kept(movie, movie_name, torrent, [path + ".magnet" for path in written_paths], 0)
+        return written_paths
+    
+    def __magnet(self, movie_name, torrent):
+        return magnet_uri(torrent.get('hash'), f"{movie_name} [{torrent.get('quality')}] [YTS.MX]")
+    
+    # One copy under every category folder, returns the written paths without extension
+    def __write_copies(self, movie, movie_name, torrent, genres, content, extension, blob = None):
+        written_paths = []
+        for genre in genres:
+            with self.stats.timer('build_path'):
+                path = self.__build_path(movie_name, movie.get('rating'), torrent.get('quality'), genre, movie.get('imdb_code'))
+            if self.__download_file(content, path, movie_name, str(movie.get('id')), extension, blob):
+                written_paths.append(path)
+        return written_paths
+    
+    def __export(self, movie, movie_name, torrent):
+        self.exporter.write(movie, torrent, self.__magnet(movie_name, torrent) if torrent.get('hash') else None)
+    
+    # Exports a kept torrent, records it in the index and moves the progress bar.
+    # Torrents cut by a budget or skipped on a rerun get no row, --resume adds none twice
+    def __kept(self, movie, movie_name, torrent, recorded_paths, size):
+        quality = torrent.get('quality')
+        if recorded_paths:
+            self.__export(movie, movie_name, torrent)
+        if recorded_paths and self.index is not None:
+            # The row reaches the file before the index vouches for the torrent, a rerun skips it after that
+            self.exporter.sync()
+            # Other kinds and layouts written into this folder stay recorded
+            entry = self.index.get(torrent.get('hash')) if torrent.get('hash') in self.index else None
+            if entry is not None:
+                recorded_paths = entry['paths'] + [path for path in recorded_paths if path not in entry['paths']]
+            self.index.record(movie.get('id'), torrent.get('hash'), quality,
+                              recorded_paths,
+                              size,
+                              imdb_code = movie.get('imdb_code'))
+        
+        if recorded_paths:
+            tqdm.write("Downloaded {} {}".format(movie_name, quality.upper()))
+            with self.lock:
+                # Current rate and concurrency of each limit
+                self.progress_bar.set_postfix_str(self.limiter.describe(), refresh = False)
                 self.progress_bar.update()
+    
+    # Indexed .torrents of an unfinished movie whose poster was never written
+    def _missing_posters(self, movie):
+        if self.index is None:
+            return []
+        paths = []
+        for torrent in movie.get('torrents') or []:
+            entry = self.index.get(torrent.get('hash')) if torrent.get('hash') else None
+            for path in entry['paths'] if entry else []:
+                path = os.path.splitext(path)[0]
+                if not self.tree.exists(path + self.posters.extension):
+                    paths.append(path)
+        return paths
+    
+    def _poster_failed(self, image_url, err):
+        tqdm.write(f"Could not process poster {image_url} : {err!r}. Skipping ...")
+        self.stats.skip('poster_invalid')
+    
+    # Poster is written next to every kept .torrent
+    def _save_poster(self, movie, bin_content_img, paths):
+        with self.stats.timer('write'):
+            if self.store is not None:
+                blob = self.store.put_poster(movie, bin_content_img, self.posters.extension)
+                for path in paths:
+                    self.store.link(blob, path + self.posters.extension)
+                    self.tree.add(path + self.posters.extension)
+                return
+            for path in paths:
+                self.__write(path + self.posters.extension, bin_content_img)
+        self.stats.count('bytes_written', len(bin_content_img) * len(paths))
+    
+    def __filter_torrents(self, movie):
+        selection = self._select_torrents(movie)
+        if selection is None:
+            self._finish_movie(movie)
+            return
+        movie_name, selected = selection
+        # Metadata only : rows are exported while selecting
+        if self.csv_only:
+            with self.lock:
+                self.progress_bar.update()
+            self._finish_movie(movie)
+            return
+        
+        if self.scheduler is not None and selected:
+            if not self.scheduler.push(movie, movie_name, selected):
+                self.stats.skip('duplicate')
+            return
+        
+        failed = False
+        written_paths = []
+        for torrent, genres in selected:
+            paths = self.__download_torrent(movie, movie_name, torrent, genres)
+            if paths is None:
+                failed = True
+                continue
+            written_paths += paths
+        self.__movie_done(movie, written_paths, failed)
+    
+    # Priority mode : one queued torrent, the movie is done with its last one
+    def __run_job(self, job):
+        movie, movie_name, torrent, genres = job
+        paths = self.__download_torrent(movie, movie_name, torrent, genres)
+        result = self.scheduler.done(movie, paths or [], paths is None)
+        if result is not None:
+            self.__movie_done(movie, *result)
+    
+    # Written paths of one selected torrent, None when it wasn't fetched
+    def __download_torrent(self, movie, movie_name, torrent, genres):
+        if not self.magnet and self._existing_copies(movie, movie_name, torrent, genres):
+            return []
+        if not self._take_budget():
+            return None
+        if self.magnet:
+            return self._save_magnet(movie, movie_name, torrent, genres)
+        bin_content_tor = self.__fetch_torrent(torrent.get('url'), movie_name, torrent.get('quality'))
+        if bin_content_tor is None:
+            self.budget.release()
+            return None
+        self.budget.spend(len(bin_content_tor))
+        return self._save_torrent(movie, movie_name, torrent, genres, bin_content_tor)
+    
+    # Poster is fetched by the poster stage once a .torrent is written,
+    # a failed or cut .torrent leaves the movie unfinished for --resume
+    def __movie_done(self, movie, written_paths, failed):
+        if self.poster and self.resume:
+            written_paths += [path for path in self._missing_posters(movie) if path not in written_paths]
+        if self.poster and written_paths:
+            self.pipeline.submit_poster(self.__download_poster, movie, written_paths, not failed)
+        elif not failed:
+            self._finish_movie(movie)
                 
+    # Reserves a torrent on the budgets, False once one ran out
+    def _take_budget(self):
+        reason = self.budget.take()
+        if reason is None:
+            return True
+        self.stats.skip('budget')
+        if self.budget.cut == 1:
+            tqdm.write(f"The {reason} budget is used up, the remaining .torrentz are left for the next run.")
+        # Page order : nothing past this point can be downloaded, stop paging
+        if self.scheduler is None:
+            self.paging_done = True
+            if self.pipeline is not None:
+                self.pipeline.stop_paging()
+        return False
+    
+    # .torrent body, None once every retry failed
+    def __fetch_torrent(self, torrent_url, movie_name, quality):
+        try:
+            with self.stats.timer('torrent_fetch'):
+                return self.transport.get(torrent_url).content
+        except requests.exceptions.RequestException as err:
+            tqdm.write(f"Could not download {movie_name} {quality} : {err}. Skipping ...")
+            self.stats.skip('fetch_failed')
+            return None
+    
     # Creates a file path for each download
     def __build_path(self, movie_name, rating, quality, movie_genre, imdb_id):
         if self.csv_only:
@@ -267,7 +808,9 @@ class Scraper:
         if self.poster:
             directory += "/" + movie_name
             
-        os.makedirs(directory, exist_ok = True)
+        # Packed layouts only exist inside the pack
+        if self.pack is None:
+            self.tree.makedirs(directory)
         
         if self.imdb_id:
             filename = f"{movie_name} {quality} - {imdb_id}"
@@ -277,51 +820,66 @@ class Scraper:
         path = os.path.join(directory, filename)
         return path
     # .bin to .torrent
-    def __download_file(self, bin_content_tor, bin_content_img, path, movie_name, movie_id):
+    def __download_file(self, bin_content_tor, path, movie_name, movie_id, extension = ".torrent", blob = None):
         if self.csv_only:
             return
         
-        if self.existing_file_counter > 10 and not self.skip_exit_condition:
-            self.__prompt_existing_files()
-        
-        if os.path.isfile(path):
-            tqdm.write(f"{movie_name} - File already exists. Skipping ...")
-            self.existing_file_counter += 1
+        if self.tree.exists(path + extension):
+            self.__skip_existing(movie_name)
             return False
         
-        with open(path + ".torrent", "wb") as torrent:
-            torrent.write(bin_content_tor)
-        if self.poster:
-            with open(path + ".jpg", "wb") as torrent:
-                torrent.write(bin_content_img)
+        with self.stats.timer('write'):
+            if blob is not None:
+                self.store.link(blob, path + extension)
+                self.tree.add(path + extension)
+            else:
+                self.__write(path + extension, bin_content_tor)
+                self.stats.count('bytes_written', len(bin_content_tor))
+        self.stats.count('files_written')
         
-        self.downloaded_movie_ids.append(movie_id)
-        self.existing_file_counter = 0
+        with self.lock:
+            self.downloaded_movie_ids.add(movie_id)
+            self.existing_file_counter = 0
         return True
     
-    def __log_csv(self, id, imdb_id, name, year, language, rating, quality, yts_url, torrent_url):
-        path = os.path.join(os.path.curdir, "YiFi-Scraper.csv")
-        csv_exists = os.path.isfile(path)
-        
-        with open(path, mode='a') as csv_file:
-            headers = ['YTS ID', 'IMDB ID', 'Movie Title', 'Year', 'Language', 'Rating', 'Quality', 'YTS URL', 'IMDb URL', 'Torrent URL']
-            writer = csv.DictWriter(csv_file, delimiter=',', lineterminator='\n', quotechar='"', quoting=csv.QUOTE_ALL, fieldnames=headers)
-            
-            if not csv_exists:
-                writer.writeheader()
-            
-            writer.writerow({'YTS id' : id, 
-                            'IMDB id' : imdb_id,
-                            'Year' : year,
-                            'Language': language,
-                            'Rating' : rating,
-                            'Quality' : quality,
-                            'YTS url' : yts_url,
-                            'IMDB url' : 'https://www/imdb.com/title/' + imdb_id,
-                            'Torrent url': torrent_url
-                            })
-            
-            
+    # A file of the layout, on disk or into the pack
+    def __write(self, path, content):
+        if self.pack is not None:
+            self.pack.put(os.path.relpath(path, self.directory), content)
+        else:
+            write_atomic(path, content)
+        self.tree.add(path)
+    
+    # Poster stage : one fetch, written next to every kept .torrent
+    def __download_poster(self, movie, paths, finish = True):
+        image_url = poster_url(movie, self.poster_size)
+        try:
+            with self.stats.timer('poster_fetch'):
+                bin_content_img = self.transport.get(image_url).content
+        except requests.exceptions.RequestException as err:
+            tqdm.write(f"Could not download poster {image_url} : {err}. Skipping ...")
+        else:
+            self.budget.spend(len(bin_content_img))
+            # Resized in the process pool, this thread only waits
+            try:
+                with self.stats.timer('poster_process'):
+                    bin_content_img = self.posters.process(bin_content_img)
+            except Exception as err:
+                self._poster_failed(image_url, err)
+            else:
+                self._save_poster(movie, bin_content_img, paths)
+        if finish:
+            self._finish_movie(movie)
+    
+    # Counts a file found on disk, asks whether to go on after 10 in a row
+    def __skip_existing(self, movie_name):
+        with self.lock:
+            if self.existing_file_counter > 10 and not self.skip_exit_condition and sys.stdin.isatty():
+                self.__prompt_existing_files()
+            tqdm.write(f"{movie_name} - File already exists. Skipping ...")
+            self.existing_file_counter += 1
+        self.stats.skip('exists')
+    
     def __prompt_existing_files(self):
         tqdm.write("Found 10 existing files . Do you want to keep downloading ? [ Y or N ]  : ")                    
         exit_answer = str(input())
@@ -336,9 +894,63 @@ class Scraper:
         else:
             tqdm.write("Invalid Input Enter only Y or N")
     
+    # Rebuilds the folder layout of the current keys from the blob store, nothing is requested
+    def relayout(self):
+        if self.store is None:
+            print("--relayout needs the blob store ( --store ) of an earlier run.")
+            sys.exit(0)
+        
+        self.tree.scan()
+        linked = 0
+        for movie, torrent, torrent_blob, poster_blob in tqdm(self.store.entries(), desc = "Relayout", unit = 'Files'):
+            quality = torrent.get('quality')
+            movie_genres = movie.get('genres') if movie.get('genres') else ['None']
+            # Same keys the API query and _select_torrents apply
+            if self.plan.movie_reject(movie) is not None or self.plan.torrent_reject(torrent) is not None:
+                continue
+            if not os.path.isfile(torrent_blob):
+                continue
+            
+            movie_name = self.__movie_name(movie)
+            genres = self.__layout_genres(movie_genres)
+            for genre in genres:
+                path = self.__build_path(movie_name, movie.get('rating'), quality, genre, movie.get('imdb_code'))
+                self.store.link(torrent_blob, path + ".torrent")
+                if self.poster and poster_blob and os.path.isfile(poster_blob):
+                    self.store.link(poster_blob, path + os.path.splitext(poster_blob)[1])
+                linked += 1
+        
+        self.store.close()
+        print(f"Linked {linked} .torrentz into {self.directory}")
+    
     def download(self):
-        self.__get_api_data()
-        self.__initialize_download()
+        # Periodic dump for long runs, hooks get every snapshot
+        if self.stats_interval:
+            write = (lambda report: tqdm.write(report, file = sys.stderr)) if self.stats_format else None
+            self.stats.start_periodic(self.stats_interval, write, self.stats_format or 'text')
+        try:
+            while True:
+                if self.engine == 'async':
+                    # aiohttp is optional, only loaded for the async engine
+                    from yifi.async_engine import AsyncEngine
+                    AsyncEngine(self, concurrency = self.concurrency).run()
+                else:
+                    self.__get_api_data()
+                    self.__initialize_download()
+                
+                if not self.watch or self.budget.exhausted():
+                    break
+                print(f"Watching for new movies. Next check in {self.watch} seconds ...")
+                time.sleep(self.watch)
+        finally:
+            self.transport.close()
+            self.posters.close()
+            if self.store is not None:
+                self.store.close()
+            self.stats.stop()
+            self.stats.emit()
+            if self.stats_format:
+                print(self.stats.report(self.stats_format), file = sys.stderr)
             
             
             
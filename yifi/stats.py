@@ -0,0 +1,162 @@
+import json
+import time
+import bisect
+import importlib
+import threading
+import contextlib
+
+# Upper bounds in seconds of the per host latency histogram, the last bucket is open
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Callable from a "module:function" spec, used by --stats-hook
+def load_hook(spec):
+    module_name, _, attribute = spec.partition(':')
+    if not module_name or not attribute:
+        raise ValueError(f"Stats hook must look like module:function, got {spec!r}")
+    hook = importlib.import_module(module_name)
+    for name in attribute.split('.'):
+        hook = getattr(hook, name)
+    return hook
+
+
+class Stats:
+    """
+    Stats class - Run instrumentation shared by the scraper, transport and engines
+
+    Keeps wall time per phase ( page fetch, JSON decode, torrent and
+    poster fetch, path building, file writes, rate limiter waits ),
+    counters for requests, retries, bytes and skips by reason, and a
+    latency histogram per host. Hooks receive a snapshot on every
+    periodic dump and once at the end of the run.
+    """
+
+    def __init__(self, hooks = ()):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.counters = {}
+        self.skipped = {}
+        self.hosts = {}
+        self.hooks = list(hooks)
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            timing = self.phases.get(phase)
+            if timing is None:
+                timing = self.phases[phase] = [0, 0.0, 0.0]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - started)
+
+    def count(self, name, value = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def skip(self, reason, value = 1):
+        with self.lock:
+            self.skipped[reason] = self.skipped.get(reason, 0) + value
+
+    # One finished request, status None for connection errors and timeouts
+    def request(self, host, seconds, status = None, size = 0):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            histogram = self.hosts.get(host)
+            if histogram is None:
+                histogram = self.hosts[host] = {'requests': 0, 'total': 0.0, 'max': 0.0,
+                                                'statuses': {}, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+            histogram['requests'] += 1
+            histogram['total'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            histogram['buckets'][bucket] += 1
+            key = str(status) if status is not None else 'error'
+            histogram['statuses'][key] = histogram['statuses'].get(key, 0) + 1
+            self.counters['requests'] = self.counters.get('requests', 0) + 1
+            self.counters['bytes_received'] = self.counters.get('bytes_received', 0) + size
+
+    @staticmethod
+    def __quantile(histogram, quantile):
+        rank = quantile * histogram['requests']
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, round(histogram['max'], 4))
+        return histogram['max']
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            phases = {phase: {'count': count, 'total': round(total, 4),
+                              'mean': round(total / count, 6) if count else 0.0, 'max': round(longest, 4)}
+                      for phase, (count, total, longest) in sorted(self.phases.items())}
+            hosts = {}
+            for host, histogram in sorted(self.hosts.items()):
+                requests = histogram['requests']
+                hosts[host] = {'requests': requests,
+                               'mean': round(histogram['total'] / requests, 6) if requests else 0.0,
+                               'p50': self.__quantile(histogram, 0.5),
+                               'p99': self.__quantile(histogram, 0.99),
+                               'max': round(histogram['max'], 4),
+                               'statuses': dict(histogram['statuses']),
+                               'buckets': {**{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, histogram['buckets'])},
+                                           'inf': histogram['buckets'][-1]}}
+            return {'elapsed': round(elapsed, 3),
+                    'phases': phases,
+                    'counters': dict(sorted(self.counters.items())),
+                    'skipped': dict(sorted(self.skipped.items())),
+                    'hosts': hosts}
+
+    # Snapshot rendered as 'json' or a short 'text' table
+    def report(self, format = 'text'):
+        snapshot = self.snapshot()
+        if format == 'json':
+            return json.dumps(snapshot)
+        lines = [f"Elapsed {snapshot['elapsed']:.2f}s"]
+        for phase, timing in snapshot['phases'].items():
+            lines.append(f"  {phase:<16} {timing['count']:>8} x  total {timing['total']:>9.3f}s  "
+                         f"mean {timing['mean'] * 1000:>8.2f} ms  max {timing['max'] * 1000:>8.1f} ms")
+        if snapshot['counters']:
+            lines.append("  " + "  ".join(f"{name} {value}" for name, value in snapshot['counters'].items()))
+        if snapshot['skipped']:
+            lines.append("  skipped : " + "  ".join(f"{reason} {value}" for reason, value in snapshot['skipped'].items()))
+        for host, histogram in snapshot['hosts'].items():
+            lines.append(f"  {host:<24} {histogram['requests']:>8} requests  p50 <= {histogram['p50'] * 1000:.0f} ms  "
+                         f"p99 <= {histogram['p99'] * 1000:.0f} ms  max {histogram['max'] * 1000:.0f} ms")
+        return "\n".join(lines)
+
+    def emit(self):
+        if not self.hooks:
+            return
+        snapshot = self.snapshot()
+        for hook in self.hooks:
+            hook(snapshot)
+
+    # Periodic dump for long runs, write gets the rendered report
+    def start_periodic(self, interval, write, format = 'text'):
+        def dump():
+            while not self.__stop.wait(interval):
+                if write is not None:
+                    write(self.report(format))
+                self.emit()
+        self.__thread = threading.Thread(target = dump, daemon = True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
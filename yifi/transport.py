@@ -0,0 +1,159 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# Full jitter exponential backoff, Retry-After wins when the server sends one
+def backoff_delay(attempt, retry_after = None, backoff = 0.5, max_backoff = 30):
+    if retry_after:
+        try:
+            return min(max_backoff, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+        try:
+            delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            return min(max_backoff, max(0.0, delay))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(max_backoff, backoff * (2 ** attempt)))
+
+
+# requests.Response served from a cache entry
+def cached_response(entry):
+    response = requests.Response()
+    response.url = entry.url
+    response.status_code = 200
+    response._content = entry.body
+    response.headers = CaseInsensitiveDict({'X-Cache': 'HIT'})
+    response.encoding = 'utf-8'
+    return response
+
+
+class Transport:
+    """
+    Transport class - Shared pooled HTTP session
+
+    Every fetch goes through one keep-alive session. Connections are
+    pooled per host, the number of in-flight requests to a single host
+    is capped, and timeouts, connection errors and retryable status
+    codes are retried with jittered exponential backoff. When a
+    `RateLimiter` is given every attempt waits for its turn there, with
+    a `ResponseCache` fresh entries are served without a request and
+    stale ones are revalidated. `offline` replays from the cache only.
+    A `Stats` instance gets every attempt, retry and limiter wait.
+    """
+
+    # Status codes worth another attempt
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size = 10, per_host = None, retries = 3,
+                 backoff = 0.5, max_backoff = 30, timeout = 5, limiter = None,
+                 cache = None, offline = False, stats = None):
+        self.pool_size = max(1, pool_size)
+        self.per_host = max(1, per_host or self.pool_size)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        # Optional RateLimiter every attempt goes through
+        self.limiter = limiter
+        self.cache = cache
+        self.offline = offline
+        self.stats = stats
+
+        self.session = requests.Session()
+        # Retries are handled here so Retry-After and jitter apply to every attempt
+        adapter = HTTPAdapter(pool_connections = 4,
+                              pool_maxsize = self.pool_size,
+                              max_retries = 0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.__host_slots = {}
+        self.__lock = threading.Lock()
+
+    # Per host semaphore capping in-flight requests
+    def __slots(self, host):
+        with self.__lock:
+            slots = self.__host_slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.per_host)
+                self.__host_slots[host] = slots
+            return slots
+
+    def get(self, url, headers = None, timeout = None):
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and (entry.fresh or self.offline):
+            if self.stats is not None:
+                self.stats.count('cache_hits')
+            return cached_response(entry)
+        if self.offline:
+            raise requests.exceptions.ConnectionError(f"Offline and not cached : {url}")
+        if entry is not None:
+            headers = dict(headers or {}, **entry.validators())
+        
+        host = urlsplit(url).netloc
+        slots = self.__slots(host)
+        attempt = 0
+        while True:
+            response = None
+            status = None
+            # Waits for a token and a concurrency slot of the url's limit
+            if self.limiter is not None:
+                waited = time.perf_counter()
+                limit = self.limiter.acquire(url)
+                if self.stats is not None:
+                    self.stats.add_time('rate_limit_wait', time.perf_counter() - waited)
+            else:
+                limit = None
+            try:
+                with slots:
+                    started = time.perf_counter()
+                    response = self.session.get(url,
+                                                timeout = timeout or self.timeout,
+                                                verify = True,
+                                                headers = headers)
+                status = response.status_code
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.retries:
+                    raise
+            finally:
+                if limit is not None:
+                    self.limiter.feedback(limit, status)
+                if self.stats is not None:
+                    self.stats.request(host, time.perf_counter() - started, status,
+                                       len(response.content) if response is not None else 0)
+
+            if response is not None:
+                if status == 304 and entry is not None:
+                    if self.stats is not None:
+                        self.stats.count('cache_revalidated')
+                    self.cache.revalidated(url)
+                    return cached_response(entry)
+                if status not in self.RETRY_STATUSES:
+                    response.raise_for_status()
+                    if self.cache is not None:
+                        self.cache.store(url, response.content, response.headers)
+                    return response
+                if attempt >= self.retries:
+                    response.raise_for_status()
+
+            retry_after = response.headers.get('Retry-After') if response is not None else None
+            delay = backoff_delay(attempt, retry_after, self.backoff, self.max_backoff)
+            if response is not None:
+                response.close()
+            attempt += 1
+            if self.stats is not None:
+                self.stats.count('retries')
+                self.stats.add_time('retry_backoff', delay)
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,65 @@
+import os
+
+
+class OutputTree:
+    """
+    OutputTree class - In-memory view of the output folder
+
+    One `os.scandir` walk at startup records every folder and file, after
+    that existence checks and `makedirs` are set lookups and only folders
+    that are really missing cost a syscall. Written files are added as
+    they land, so the view stays current for the whole run. Paths are
+    normalised, `out/1+/x` and `./out/1+/x` are the same entry. Set
+    lookups and adds are atomic under the GIL, workers share it freely.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.directories = set()
+        self.files = set()
+        self.scanned = False
+
+    # Single walk of the tree, symlinked folders are not followed
+    def scan(self):
+        if self.scanned:
+            return self
+        self.scanned = True
+        root = os.path.normpath(self.root)
+        if not os.path.isdir(root):
+            return self
+        self.directories.add(root)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    path = os.path.join(directory, entry.name)
+                    if entry.is_dir(follow_symlinks = False):
+                        self.directories.add(path)
+                        stack.append(path)
+                    else:
+                        self.files.add(path)
+        return self
+
+    def exists(self, path):
+        return os.path.normpath(path) in self.files
+
+    def add(self, path):
+        self.files.add(os.path.normpath(path))
+
+    # makedirs that only reaches the filesystem for folders it hasn't seen
+    def makedirs(self, directory):
+        directory = os.path.normpath(directory)
+        if directory in self.directories:
+            return
+        os.makedirs(directory, exist_ok = True)
+        while directory and directory not in self.directories:
+            self.directories.add(directory)
+            directory = os.path.dirname(directory)
+
+    def __len__(self):
+        return len(self.files)
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import random
+import threading
+from yifi.fsutil import write_atomic
+
+# Browsers sent when fake_useragent can't be loaded and nothing is cached
+FALLBACK_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+]
+
+DEFAULT_PATH = os.path.join("~", ".cache", "yifi", "user-agents.json")
+
+
+class UserAgentPool:
+    """
+    UserAgentPool class - User-Agent strings built once, rotated per request
+
+    fake_useragent loads its browser data on every `UserAgent()`, so the
+    pool samples it once, keeps the strings in a JSON file for `ttl`
+    seconds and deals them out in a shuffled rotation. It is filled on
+    the first `next`, runs that never send a request never import
+    fake_useragent, and runs with a fresh cache file don't either. A
+    missing or failing fake_useragent falls back to a few common
+    browsers, a header is always returned.
+    """
+
+    def __init__(self, path = DEFAULT_PATH, size = 50, ttl = 7 * 24 * 3600):
+        self.path = os.path.expanduser(path) if path else None
+        self.size = size
+        self.ttl = ttl
+        self.agents = None
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def __load(self):
+        if self.path is None:
+            return None
+        try:
+            if time.time() - os.path.getmtime(self.path) > self.ttl:
+                return None
+            with open(self.path) as file:
+                agents = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return [agent for agent in agents if isinstance(agent, str)] or None
+
+    def __build(self):
+        try:
+            from fake_useragent import UserAgent
+            user_agent = UserAgent()
+            agents = list(dict.fromkeys(user_agent.random for _ in range(self.size * 2)))[:self.size]
+        except Exception:
+            return list(FALLBACK_USER_AGENTS)
+        if self.path is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok = True)
+                write_atomic(self.path, json.dumps(agents).encode())
+            except OSError:
+                pass
+        return agents or list(FALLBACK_USER_AGENTS)
+
+    def next(self):
+        with self.lock:
+            if self.agents is None:
+                self.agents = self.__load() or self.__build()
+                random.shuffle(self.agents)
+            agent = self.agents[self.position % len(self.agents)]
+            self.position += 1
+            return agent
+
+    def headers(self):
+        return {'User-Agent': self.next()}